@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark the lean read path used by the list endpoints on 1000-order responses.
+
+    python bench_read_path.py [--orders 1000] [--rounds 20] [--legacy-share 0.1]
+
+"model" is the previous path: Order(**doc) for every document, FastAPI's response_model
+validation/serialization of List[Order], then rendering. "lean" is ORDER_SHAPE.shape_all()
+rendered directly, as /orders and /orders/active now do. Some documents use the legacy
+item format (price instead of base_price/total_price) so the compatibility path is covered.
+Uses the same backend/.env settings as server.py, but never touches the database.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from typing import List
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from bench_render_json import make_orders
+from server import ORDER_SHAPE, Order, render_json
+
+
+def as_stored(orders: list, legacy_share: float) -> list:
+    """Documents as Motor returns them with ORDER_SHAPE.projection: no _id, enum values as strings,
+    naive UTC datetimes"""
+    rng = random.Random(7)
+    documents = []
+    for order in orders:
+        document = {**order, "status": order["status"].value, "order_type": order["order_type"].value}
+        document["created_at"] = document["created_at"].replace(tzinfo=None)
+        if rng.random() < legacy_share:
+            document["items"] = [
+                {"menu_item_id": item["menu_item_id"], "quantity": item["quantity"], "price": item["base_price"]}
+                for item in document["items"]
+            ]
+        documents.append(document)
+    return documents
+
+
+def model_path(documents: list, field, loop) -> bytes:
+    orders = [Order(**document) for document in documents]
+    content = loop.run_until_complete(serialize_response(field=field, response_content=orders))
+    return render_json(content)
+
+
+def lean_path(documents: list) -> bytes:
+    return render_json(ORDER_SHAPE.shape_all(documents))
+
+
+def time_per_thousand(run, count: int, rounds: int) -> float:
+    run()  # Warm up
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000 * (1000 / count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark list endpoint response building")
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--legacy-share", type=float, default=0.1)
+    args = parser.parse_args()
+
+    documents = as_stored(make_orders(args.orders), args.legacy_share)
+    field = create_model_field(name="Response_get_orders", type_=List[Order], mode="serialization")
+
+    loop = asyncio.new_event_loop()
+    model_ms = time_per_thousand(lambda: model_path(documents, field, loop), args.orders, args.rounds)
+    lean_ms = time_per_thousand(lambda: lean_path(documents), args.orders, args.rounds)
+    print(f"{args.orders} orders ({args.legacy_share:.0%} legacy items), best of {args.rounds}")
+    print(f"  model + response_model  {model_ms:8.2f} ms / 1000 orders")
+    print(f"  lean shape              {lean_ms:8.2f} ms / 1000 orders")
+    print(f"  speedup                 {model_ms / lean_ms:8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark CustomJSONResponse rendering on realistic order payloads.
+
+    python bench_render_json.py [--orders 1000] [--rounds 20]
+
+Compares the stdlib encoder (render_json_stdlib) with render_json, which uses orjson when it
+is installed, checks that both produce identical bytes, and prints milliseconds per 1000 orders.
+Uses the same backend/.env settings as server.py, but never touches the database.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import timedelta
+
+from server import (
+    Order, OrderItem, OrderItemModifier, get_current_time, orjson, render_json, render_json_stdlib
+)
+
+
+def make_orders(count: int) -> list:
+    """Order documents shaped like the /orders response (model dicts, naive and aware datetimes)"""
+    rng = random.Random(42)
+    now = get_current_time()
+    orders = []
+    for n in range(count):
+        items = [
+            OrderItem(
+                menu_item_id=f"item-{rng.randint(1, 80)}",
+                menu_item_name=rng.choice(["Margherita Pizza", "Caesar Salad", "Café con leche", "Wings"]),
+                quantity=rng.randint(1, 4),
+                base_price=round(rng.uniform(3, 25), 2),
+                modifiers=[OrderItemModifier(modifier_id=f"mod-{m}", name="Extra cheese", price=1.5)
+                           for m in range(rng.randint(0, 2))],
+                total_price=round(rng.uniform(3, 100), 2),
+            )
+            for _ in range(rng.randint(1, 6))
+        ]
+        subtotal = round(sum(item.total_price for item in items), 2)
+        order = Order(
+            order_number=f"ORD-{n:04d}",
+            customer_name="Jane Doe",
+            customer_phone="5551234567",
+            items=items,
+            subtotal=subtotal,
+            tax=round(subtotal * 0.08875, 2),
+            total=round(subtotal * 1.08875, 2),
+            order_type=rng.choice(["dine_in", "takeout", "delivery"]),
+            created_by="user-1",
+            created_at=now - timedelta(minutes=n),
+        ).dict()
+        # Documents read back from Mongo carry naive UTC datetimes
+        order["updated_at"] = order["updated_at"].replace(tzinfo=None)
+        orders.append(order)
+    return orders
+
+
+def time_per_thousand(render, payload, count: int, rounds: int) -> float:
+    render(payload)  # Warm up
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        render(payload)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000 * (1000 / count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON rendering of order lists")
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    payload = make_orders(args.orders)
+    stdlib_body = render_json_stdlib(payload)
+    fast_body = render_json(payload)
+    if stdlib_body != fast_body:
+        print("MISMATCH: render_json output differs from the stdlib encoder")
+        return 1
+
+    stdlib_ms = time_per_thousand(render_json_stdlib, payload, args.orders, args.rounds)
+    fast_ms = time_per_thousand(render_json, payload, args.orders, args.rounds)
+    backend = f"orjson {orjson.__version__}" if orjson else "stdlib (orjson not installed)"
+    print(f"{args.orders} orders, {len(stdlib_body) / 1024:.0f} KiB, best of {args.rounds}")
+    print(f"  stdlib json.dumps   {stdlib_ms:8.2f} ms / 1000 orders")
+    print(f"  render_json         {fast_ms:8.2f} ms / 1000 orders  [{backend}]")
+    print(f"  speedup             {stdlib_ms / fast_ms:8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Index maintenance for the POS database.
+
+    python db_indexes.py report   # declared indexes that are missing, plus unused/undeclared ones
+    python db_indexes.py ensure   # create every missing declared index
+
+Uses the same MONGO_URL/DB_NAME settings (backend/.env) as server.py.
+"""
+import argparse
+import asyncio
+import sys
+
+from server import INDEX_SPECS, client, db, ensure_indexes
+
+
+def key_pattern(keys) -> tuple:
+    # Text/hashed/2dsphere indexes use string "directions"; keep those as they are
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction)
+                 for field, direction in keys)
+
+
+async def report_indexes() -> int:
+    declared = {}
+    for spec in INDEX_SPECS:
+        declared.setdefault(spec["collection"], set()).add(key_pattern(spec["keys"]))
+
+    problems = 0
+    for collection_name, declared_patterns in sorted(declared.items()):
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        existing_patterns = {key_pattern(info["key"]): name for name, info in existing.items()}
+
+        # $indexStats counts operations since the mongod process started
+        usage = {}
+        try:
+            async for stat in collection.aggregate([{"$indexStats": {}}]):
+                usage[stat["name"]] = stat["accesses"]["ops"]
+        except Exception as e:
+            print(f"  (index usage unavailable for {collection_name}: {e})")
+
+        print(f"{collection_name}:")
+        for pattern in sorted(declared_patterns):
+            if pattern in existing_patterns:
+                name = existing_patterns[pattern]
+                ops = usage.get(name)
+                status = "unused" if ops == 0 else "ok"
+                print(f"  {status:<9} {name}" + (f"  ops={ops}" if ops is not None else ""))
+            else:
+                problems += 1
+                print(f"  MISSING   {list(pattern)}")
+
+        for pattern, name in sorted(existing_patterns.items(), key=lambda item: item[1]):
+            if name == "_id_" or pattern in declared_patterns:
+                continue
+            print(f"  extra     {name}  ops={usage.get(name, '?')}  (not declared in INDEX_SPECS)")
+
+    return problems
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Report or create the POS database indexes")
+    parser.add_argument("command", choices=["report", "ensure"])
+    args = parser.parse_args()
+
+    try:
+        if args.command == "ensure":
+            failed = await ensure_indexes()
+            for description in failed:
+                print(f"FAILED    {description}")
+            print("Indexes ensured" if not failed else f"{len(failed)} index(es) could not be built")
+            return 1 if failed else 0
+
+        problems = await report_indexes()
+        print(f"\n{problems} missing index(es)")
+        return 1 if problems else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
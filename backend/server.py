@@ -1,21 +1,43 @@
 from fastapi.encoders import jsonable_encoder
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import os
+import re
+import unicodedata
+import asyncio
 import logging
+import time
 from pathlib import Path
 from pydantic import BaseModel, Field
 import json
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 import uuid
 from datetime import datetime, timedelta, timezone
 from enum import Enum
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import bcrypt
+import hmac
+import hashlib
+import base64
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 import pytz
+import gzip
+import numpy as np
+from starlette.datastructures import Headers, MutableHeaders
+try:
+    import orjson
+except ImportError:  # Optional: render_json falls back to the stdlib encoder
+    orjson = None
+try:
+    import brotli
+except ImportError:  # Optional: responses fall back to gzip
+    brotli = None
 
 # Set timezone to Eastern Daylight Time
 EDT = pytz.timezone('US/Eastern')
@@ -49,21 +71,48 @@ db = client[os.environ['DB_NAME']]
 app = FastAPI()
 
 # Custom JSON response for proper datetime serialization
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.encoders import jsonable_encoder
 
+def json_default(obj):
+    """Custom serialization for datetime, UUID and Enum objects"""
+    if isinstance(obj, datetime):
+        if obj.tzinfo is None:
+            # If timezone naive, assume UTC
+            obj = obj.replace(tzinfo=pytz.UTC)
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
+
+def render_json_stdlib(content: Any) -> bytes:
+    return json.dumps(content, default=json_default, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+# orjson serializes datetimes natively; OPT_NAIVE_UTC gives naive (Mongo) datetimes the same
+# "+00:00" suffix json_default adds, so both paths produce identical bytes
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+def render_json(content: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(content, default=json_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers beyond 64 bits; let the stdlib encoder handle or reject it
+    return render_json_stdlib(content)
+
 class CustomJSONResponse(JSONResponse):
     def render(self, content: Any) -> bytes:
-        # Custom serialization for datetime objects
-        def custom_serializer(obj):
-            if isinstance(obj, datetime):
-                if obj.tzinfo is None:
-                    # If timezone naive, assume UTC
-                    obj = obj.replace(tzinfo=pytz.UTC)
-                return obj.isoformat()
-            raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
-        
-        return json.dumps(content, default=custom_serializer, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+        return render_json(content)
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the client's If-None-Match already names this ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
 
 # Set default response class
 app.default_response_class = CustomJSONResponse
@@ -76,6 +125,71 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production'
 JWT_ALGORITHM = 'HS256'
 security = HTTPBearer()
 
+# Key for the PIN lookup fingerprint (HMAC-SHA256 of the PIN). Changing it invalidates
+# every stored fingerprint; users fall back to the legacy scan until they log in again.
+PIN_LOOKUP_SECRET = os.environ.get('PIN_LOOKUP_SECRET', JWT_SECRET)
+
+# bcrypt work runs on its own bounded pool so a login burst can't stall the event loop
+PIN_HASH_WORKERS = int(os.environ.get('PIN_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+PIN_HASH_MAX_QUEUE = int(os.environ.get('PIN_HASH_MAX_QUEUE', 64))  # 0 means unbounded
+
+# Decoded tokens and resolved principals are cached briefly to avoid a users lookup per request
+AUTH_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', 60))
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 1024))
+# How long after issue a token's role/active claims are trusted without reading the user record
+AUTH_CLAIMS_TTL = float(os.environ.get('AUTH_CLAIMS_TTL', 60))
+
+# Active tax/charge rules are held in memory and reloaded when the shared config version changes;
+# the TTL is only a backstop for writes made outside the API
+CHARGE_RULES_TTL = float(os.environ.get('CHARGE_RULES_TTL', 300))
+# Pricing re-reads the shared config version at most this often, so most orders price with no DB
+# read; config change-stream events and this worker's own writes apply immediately
+CHARGE_RULES_VERSION_CHECK = float(os.environ.get('CHARGE_RULES_VERSION_CHECK', 5))
+
+# Customer total_orders/total_spent are kept incrementally; a periodic job rebuilds them from
+# paid orders (0 disables it)
+CUSTOMER_STATS_RECONCILE_HOURS = float(os.environ.get('CUSTOMER_STATS_RECONCILE_HOURS', 24))
+
+# Customer phone keys assume this country code when a number is entered without one
+DEFAULT_PHONE_COUNTRY_CODE = os.environ.get('DEFAULT_PHONE_COUNTRY_CODE', '1')
+
+# Typeahead results returned by GET /customers/search
+CUSTOMER_SEARCH_LIMIT = int(os.environ.get('CUSTOMER_SEARCH_LIMIT', 20))
+CUSTOMER_SEARCH_LIMIT_MAX = int(os.environ.get('CUSTOMER_SEARCH_LIMIT_MAX', 50))
+
+# Recent orders returned with a caller-ID lookup
+CALLER_RECENT_ORDERS = int(os.environ.get('CALLER_RECENT_ORDERS', 5))
+
+# Response compression: bodies smaller than COMPRESSION_MIN_SIZE bytes are sent as-is
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
+COMPRESSED_BODY_CACHE_SIZE = int(os.environ.get('COMPRESSED_BODY_CACHE_SIZE', 64))
+
+# Menu items, categories and modifiers are served from an in-process catalog, rebuilt when the
+# shared menu version changes; the TTL is only a backstop for writes made outside the API
+MENU_CATALOG_TTL = float(os.environ.get('MENU_CATALOG_TTL', 300))
+
+# Order numbers come from an atomic counter; workers can reserve them in blocks under rush load
+ORDER_NUMBER_BLOCK_SIZE = max(1, int(os.environ.get('ORDER_NUMBER_BLOCK_SIZE', 1)))
+ORDER_NUMBER_RESET = os.environ.get('ORDER_NUMBER_RESET', 'never')  # "never" or "daily"
+ORDER_NUMBER_LOCATION = os.environ.get('ORDER_NUMBER_LOCATION', '')  # Optional per-location sequence
+
+# Page sizes for cursor-paginated order listings
+ORDER_PAGE_SIZE = int(os.environ.get('ORDER_PAGE_SIZE', 50))
+ORDER_PAGE_SIZE_MAX = int(os.environ.get('ORDER_PAGE_SIZE_MAX', 200))
+
+# Active order delta sync: how far behind "now" sync cursors stay (to catch writes that commit late)
+# and how long deleted-order tombstones are kept; older cursors get a full resync
+ORDER_SYNC_SKEW_SECONDS = float(os.environ.get('ORDER_SYNC_SKEW_SECONDS', 2))
+ORDER_TOMBSTONE_TTL = int(os.environ.get('ORDER_TOMBSTONE_TTL', 86400))
+
+# Live event channel: "local" publishes from this process's routes; "change_stream" tails MongoDB
+# (replica set required) so every worker sees every write
+LIVE_EVENTS_SOURCE = os.environ.get('LIVE_EVENTS_SOURCE', 'local')
+LIVE_EVENT_QUEUE_SIZE = int(os.environ.get('LIVE_EVENT_QUEUE_SIZE', 256))
+LIVE_EVENT_HEARTBEAT_SECONDS = float(os.environ.get('LIVE_EVENT_HEARTBEAT_SECONDS', 15))
+
 # Enums
 class OrderStatus(str, Enum):
     DRAFT = "draft"  # In cart, not sent yet
@@ -167,6 +281,10 @@ class Table(BaseModel):
     
     @classmethod
     def from_db_data(cls, data: dict):
+        return cls(**cls.migrate_legacy_fields(data))
+    
+    @staticmethod
+    def migrate_legacy_fields(data: dict) -> dict:
         """Handle migration from old number+name structure to new name-only structure"""
         # If it's old data with number field, convert to new structure
         if 'number' in data and 'name' not in data:
@@ -184,7 +302,7 @@ class Table(BaseModel):
         # Remove the old number field if it exists
         data.pop('number', None)
         
-        return cls(**data)
+        return data
 
 class TableCreate(BaseModel):
     name: str  # Table identifier/name
@@ -256,6 +374,10 @@ class OrderItem(BaseModel):
     price: Optional[float] = None
 
     def __init__(self, **data):
+        super().__init__(**self.migrate_legacy_fields(data))
+    
+    @staticmethod
+    def migrate_legacy_fields(data: dict) -> dict:
         # Handle backward compatibility
         if 'price' in data and 'base_price' not in data:
             data['base_price'] = data['price']
@@ -263,8 +385,7 @@ class OrderItem(BaseModel):
             data['total_price'] = data['price'] * data.get('quantity', 1)
         if 'menu_item_name' not in data:
             data['menu_item_name'] = f"Item {data.get('menu_item_id', '')[:8]}"
-            
-        super().__init__(**data)
+        return data
 
 class ItemRemoval(BaseModel):
     reason: RemovalReason
@@ -294,6 +415,7 @@ class Order(BaseModel):
     gratuity: float = 0.0  # Track automatic gratuity separately
     discounts: float = 0.0  # Track applied discounts separately
     applied_discount_ids: List[str] = []  # Track which discount policies were applied
+    pricing_breakdown: Optional[Dict] = None  # Per-rule taxes/charges/gratuity/discounts from the pricing pass
     tip: float = 0.0
     total: float
     order_type: OrderType
@@ -302,6 +424,7 @@ class Order(BaseModel):
     payment_status: str = "pending"
     cash_received: Optional[float] = None
     change_amount: Optional[float] = None
+    paid_at: Optional[datetime] = None  # When the order was (first) paid
     created_by: str = ""
     created_at: datetime = Field(default_factory=get_current_time)
     updated_at: datetime = Field(default_factory=get_current_time)
@@ -332,6 +455,63 @@ class OrderCreate(BaseModel):
     order_notes: str = ""  # Notes/comments for the order
     applied_discount_ids: List[str] = []  # Discount policies to apply
 
+class OrderSummary(BaseModel):
+    """Slim order row for list screens; full documents come from GET /orders/{order_id}"""
+    id: str
+    order_number: str
+    order_type: OrderType
+    status: OrderStatus
+    payment_status: str = "pending"
+    table_id: Optional[str] = None
+    table_name: Optional[str] = None
+    customer_id: Optional[str] = None
+    customer_name: str = ""
+    customer_phone: str = ""
+    total: float
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+class OrderPage(BaseModel):
+    orders: List[OrderSummary]
+    next_cursor: Optional[str] = None
+
+    class Config:
+        # Keeps /orders/active delta responses from matching this shape
+        extra = "forbid"
+
+class ActiveOrdersDelta(BaseModel):
+    orders: List[Order]  # Active orders created or changed since the cursor
+    removed_ids: List[str] = []  # Orders that left the active set or were deleted
+    cursor: str
+    reset: bool = False  # True when this is a full list and the client should replace its state
+
+class OrderItemSummary(BaseModel):
+    menu_item_name: Optional[str] = ""
+    quantity: int = 1
+
+class OrderHistoryRow(OrderSummary):
+    payment_method: Optional[PaymentMethod] = None
+    items: List[OrderItemSummary] = []  # Name and quantity only, for list cards
+
+class OrderHistoryPage(BaseModel):
+    orders: List[OrderHistoryRow]
+    total_count: Optional[int] = None  # Only computed for the first page
+    next_cursor: Optional[str] = None
+
+class CustomerStats(BaseModel):
+    total_orders: int = 0
+    total_spent: float = 0.0
+    last_order_date: Optional[datetime] = None
+    days_since_last_order: Optional[int] = None
+    average_order_value: float = 0.0
+
+class CallerLookup(BaseModel):
+    """Everything the phone-order screen shows for a caller, in one response"""
+    customer: Customer
+    stats: CustomerStats
+    recent_orders: List[OrderHistoryRow]  # Newest first
+    next_cursor: Optional[str] = None  # Continue with GET /customers/{id}/orders
+
 class PaymentRequest(BaseModel):
     payment_method: PaymentMethod
     cash_received: Optional[float] = None
@@ -376,6 +556,14 @@ class UserLogin(BaseModel):
 class PinVerification(BaseModel):
     pin: str
 
+class Principal(BaseModel):
+    """Authenticated caller as seen by route handlers"""
+    id: str
+    role: UserRole
+    full_name: str = ""
+    active: bool = True
+    auth_version: int = 0  # Tokens carrying an older version were issued before a role/PIN/active change
+
 class TimeEntry(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -498,23 +686,143 @@ class DiscountPolicyCreate(BaseModel):
     valid_until: Optional[datetime] = None
     usage_limit: int = 0
 
+class PricingQuote(BaseModel):
+    subtotal: float
+    order_type: OrderType = OrderType.DINE_IN
+    party_size: int = 1
+    applied_discount_ids: List[str] = []
+
+class BatchPricingRequest(BaseModel):
+    quotes: List[PricingQuote]
+
+# Upper bound on quotes per /tax-charges/calculate/batch request
+MAX_BATCH_PRICING_QUOTES = 5000
+
 # Authentication helpers
+class TTLCache:
+    """Small in-process LRU cache whose entries also expire after a TTL"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple[float, Any]]" = OrderedDict()
+    
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+    
+    def set(self, key, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def pop(self, key):
+        self._data.pop(key, None)
+    
+    def clear(self):
+        self._data.clear()
+
+token_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+principal_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = get_current_time() + timedelta(hours=24)
-    to_encode.update({"exp": expire})
+    now = get_current_time()
+    expire = now + timedelta(hours=24)
+    to_encode.update({"exp": expire, "iat": now})
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def user_is_active(user: Dict) -> bool:
+    # Users seeded by create_admin.py carry is_active; the API writes active
+    return bool(user.get("active", True) and user.get("is_active", True))
+
+def create_user_access_token(user: Dict) -> str:
+    """Access token carrying the role/name/active claims used by current_principal"""
+    role = user.get("role")
+    return create_access_token(data={
+        "sub": user["id"],
+        "role": role.value if isinstance(role, Enum) else role,
+        "name": user.get("full_name", ""),
+        "active": user_is_active(user),
+        "ver": user.get("auth_version", 0)
+    })
+
+def decode_token(token: str) -> Dict:
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-        return user_id
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    # Never keep a token cached past its own expiry
+    token_cache.set(token, payload, ttl=payload["exp"] - time.time() if "exp" in payload else None)
+    return payload
+
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    return (await resolve_principal(credentials.credentials)).id
+
+async def current_principal(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Principal:
+    return await resolve_principal(credentials.credentials)
+
+async def resolve_principal(token: str) -> Principal:
+    """Resolve the caller from cache, then fresh token claims, and otherwise from the database.
+    
+    Claims are only trusted for AUTH_CLAIMS_TTL after issue, and cached principals for AUTH_CACHE_TTL,
+    so a role change or deactivation made on any worker applies everywhere within those windows.
+    """
+    payload = decode_token(token)
+    user_id = payload["sub"]
+    
+    principal = principal_cache.get(user_id)
+    if principal is not None and payload.get("ver", 0) > principal.auth_version:
+        principal = None  # Cached from a token issued before the user's latest change
+    if principal is None:
+        claims_fresh = time.time() - payload.get("iat", 0) < AUTH_CLAIMS_TTL
+        if payload.get("role") and claims_fresh:
+            principal = Principal(
+                id=user_id,
+                role=payload["role"],
+                full_name=payload.get("name", ""),
+                active=payload.get("active", True),
+                auth_version=payload.get("ver", 0)
+            )
+        else:
+            user = await db.users.find_one({"id": user_id}, {
+                "_id": 0, "role": 1, "full_name": 1, "active": 1, "is_active": 1, "auth_version": 1
+            })
+            if not user:
+                raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+            principal = Principal(
+                id=user_id,
+                role=user["role"],
+                full_name=user.get("full_name", ""),
+                active=user_is_active(user),
+                auth_version=user.get("auth_version", 0)
+            )
+        principal_cache.set(user_id, principal)
+    
+    if payload.get("ver", 0) < principal.auth_version:
+        raise HTTPException(status_code=401, detail="Session expired, please sign in again")
+    if not principal.active:
+        raise HTTPException(status_code=401, detail="Account is deactivated")
+    return principal
+
+def invalidate_principal(user_id: str):
+    """Drop this worker's cached auth state for a user after their record changes"""
+    principal_cache.pop(user_id)
 
 def hash_pin(pin: str) -> str:
     return bcrypt.hashpw(pin.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -522,139 +830,1413 @@ def hash_pin(pin: str) -> str:
 def verify_pin(pin: str, hashed: str) -> bool:
     return bcrypt.checkpw(pin.encode('utf-8'), hashed.encode('utf-8'))
 
+class PinHashExecutor:
+    """Dedicated thread pool for bcrypt hashing/verification with queue-depth metrics"""
+    
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pin-hash")
+        self.in_flight = 0  # Running plus waiting for a worker
+        self.peak_queue_depth = 0
+        self.completed = 0
+        self.rejected = 0
+    
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.max_workers)
+    
+    async def run(self, func, *args):
+        if self.max_queue and self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Authentication service busy, please try again")
+        
+        self.in_flight += 1
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": min(self.in_flight, self.max_workers),
+            "queue_depth": self.queue_depth,
+            "peak_queue_depth": self.peak_queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+pin_hasher = PinHashExecutor(PIN_HASH_WORKERS, PIN_HASH_MAX_QUEUE)
+
+def pin_fingerprint(pin: str) -> str:
+    """Keyed fingerprint of a PIN, used to find the single candidate user without bcrypt"""
+    return hmac.new(PIN_LOOKUP_SECRET.encode('utf-8'), pin.encode('utf-8'), hashlib.sha256).hexdigest()
+
 async def verify_user_pin(pin: str) -> Optional[Dict]:
     """Verify PIN and return user data"""
-    users = await db.users.find().to_list(1000)
-    for user in users:
-        if verify_pin(pin, user.get('hashed_pin', '')):
+    fingerprint = pin_fingerprint(pin)
+    user = await db.users.find_one({"pin_fingerprint": fingerprint})
+    if user:
+        return user if await pin_hasher.run(verify_pin, pin, user.get('hashed_pin', '')) else None
+    
+    # Legacy users without a fingerprint: scan only those, and backfill on a match
+    legacy_users = await db.users.find({"pin_fingerprint": {"$exists": False}}).to_list(1000)
+    for user in legacy_users:
+        if await pin_hasher.run(verify_pin, pin, user.get('hashed_pin', '')):
+            await db.users.update_one({"id": user["id"]}, {"$set": {"pin_fingerprint": fingerprint}})
+            user["pin_fingerprint"] = fingerprint
             return user
     return None
 
-async def calculate_order_taxes_and_charges(subtotal: float, order_type: str, party_size: int = 1, 
-                                           applied_discounts: List[str] = None) -> tuple[float, float, float, float]:
-    """Calculate dynamic taxes, service charges, gratuity, and discounts for an order"""
-    if applied_discounts is None:
-        applied_discounts = []
-    
-    total_tax = 0.0
-    total_service_charges = 0.0
-    total_gratuity = 0.0
-    total_discounts = 0.0
-    
-    # Get active tax rates that apply to this order type
-    # Include taxes that either:
-    # 1. Have empty applies_to_order_types array (apply to all order types)
-    # 2. Have the current order_type in their applies_to_order_types array
-    tax_rates = await db.tax_rates.find({
-        "active": True,
-        "$or": [
-            {"applies_to_order_types": {"$exists": False}},  # Field doesn't exist
-            {"applies_to_order_types": {"$size": 0}},       # Empty array (apply to all)
-            {"applies_to_order_types": {"$in": [order_type]}} # Contains this order type
-        ]
+async def migrate_pin_fingerprints():
+    """Backfill PIN fingerprints for existing users"""
+    # Users seeded by create_admin.py still carry the plain PIN, so they can be migrated
+    # directly. Users created via /auth/register only have the bcrypt hash and are
+    # backfilled by verify_user_pin on their next successful login.
+    legacy_users = await db.users.find({
+        "pin_fingerprint": {"$exists": False},
+        "pin": {"$exists": True}
     }).to_list(1000)
+    for user in legacy_users:
+        await db.users.update_one(
+            {"id": user["id"]},
+            {"$set": {"pin_fingerprint": pin_fingerprint(str(user["pin"]))}}
+        )
+    if legacy_users:
+        logger.info(f"Backfilled PIN fingerprints for {len(legacy_users)} users")
+
+# Response compression
+COMPRESSIBLE_MEDIA_TYPES = ("application/json", "text/plain", "text/html", "text/csv")
+UNCOMPRESSED_ENDPOINTS = set()
+
+def uncompressed(endpoint):
+    """Route decorator (below @api_router.*) opting a route out of CompressionMiddleware"""
+    UNCOMPRESSED_ENDPOINTS.add(endpoint)
+    return endpoint
+
+def preferred_encoding(accept_encoding: str) -> Optional[str]:
+    """Best content coding we can produce for an Accept-Encoding header: br, then gzip"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for coding in (("br", "gzip") if brotli else ("gzip",)):
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+class CompressionMiddleware:
+    """gzip/brotli for complete responses of at least minimum_size bytes.
+    
+    Streaming responses (SSE), already-encoded bodies, non-text media types and
+    @uncompressed routes pass through untouched.
+    """
+    
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = preferred_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message  # Held until we see whether the body is complete
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+            
+            start, start_message = start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if message.get("more_body") or not self.should_compress(scope, headers, body):
+                await send(start)
+                await send(message)
+                return
+            
+            body = compress_body(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({**message, "body": body})
+        
+        await self.app(scope, receive, send_compressed)
+    
+    def should_compress(self, scope, headers: MutableHeaders, body: bytes) -> bool:
+        # The router fills in scope["endpoint"] before the response starts
+        if scope.get("endpoint") in UNCOMPRESSED_ENDPOINTS or "content-encoding" in headers:
+            return False
+        media_type = headers.get("content-type", "").split(";")[0].strip()
+        return len(body) >= self.minimum_size and media_type in COMPRESSIBLE_MEDIA_TYPES
+
+# Compressed variants of cacheable bodies, keyed by (ETag, encoding)
+compressed_bodies = TTLCache(COMPRESSED_BODY_CACHE_SIZE, ttl=24 * 3600)
+
+def cached_body_response(request: Request, body: bytes, etag: str, headers: Dict[str, str]) -> Response:
+    """JSON response for a versioned body, compressed at most once per ETag and encoding"""
+    headers = {**headers, "ETag": etag, "Vary": "Accept-Encoding"}
+    encoding = preferred_encoding(request.headers.get("accept-encoding", ""))
+    if encoding and len(body) >= COMPRESSION_MIN_SIZE:
+        compressed = compressed_bodies.get((etag, encoding))
+        if compressed is None:
+            compressed = compress_body(body, encoding)
+            compressed_bodies.set((etag, encoding), compressed)
+        body = compressed
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Request coalescing
+class SingleFlight:
+    """Concurrent callers with the same key share one in-flight computation.
+    
+    The work runs as its own task, so a caller that disconnects doesn't cancel it for the others.
+    Keys are tuples whose first element names the read, e.g. ("orders/active", user scope).
+    """
+    
+    def __init__(self):
+        self._in_flight: Dict[tuple, asyncio.Task] = {}
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+    
+    async def do(self, key: tuple, fn):
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses[key[0]] = self.misses.get(key[0], 0) + 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.hits[key[0]] = self.hits.get(key[0], 0) + 1
+        return await asyncio.shield(task)
+    
+    def stats(self) -> Dict:
+        reads = {name: {"hits": self.hits.get(name, 0), "misses": misses} for name, misses in self.misses.items()}
+        return {"reads": reads, "in_flight": len(self._in_flight)}
+
+single_flight = SingleFlight()
+
+def json_body_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+# Lean read path
+class LeanShape:
+    """Shapes trusted database documents into a model's response fields without Pydantic validation.
+    
+    List endpoints return these rows in a CustomJSONResponse, skipping both the Model(**doc) pass
+    and FastAPI's response_model re-validation. Missing fields get the model's defaults.
+    """
+    
+    def __init__(self, model, migrate=None, nested: Optional[Dict[str, "LeanShape"]] = None,
+                 legacy_fields: tuple = ()):
+        fields = model.__fields__
+        # legacy_fields are read only so `migrate` can convert them; migrate must drop them again
+        self.projection = {"_id": 0, **{name: 1 for name in (*fields, *legacy_fields)}}
+        self.defaults = {name: field.default for name, field in fields.items()
+                         if not field.is_required() and field.default_factory is None}
+        self.factories = {name: field.default_factory for name, field in fields.items()
+                          if field.default_factory is not None}
+        self.migrate = migrate
+        self.nested = nested or {}
+    
+    def shape(self, document: Dict) -> Dict:
+        """document should come from a find() using self.projection, so it holds no foreign keys"""
+        if self.migrate:
+            document = self.migrate(document)
+        row = {**self.defaults, **document}
+        for name, factory in self.factories.items():
+            if name not in row:
+                row[name] = factory()
+        for name, shape in self.nested.items():
+            if row.get(name):
+                row[name] = [shape.shape(value) for value in row[name]]
+        return row
+    
+    def shape_all(self, documents: List[Dict]) -> List[Dict]:
+        return [self.shape(document) for document in documents]
+
+ORDER_SHAPE = LeanShape(Order, nested={"items": LeanShape(OrderItem, migrate=OrderItem.migrate_legacy_fields)})
+CUSTOMER_SHAPE = LeanShape(Customer)
+TABLE_SHAPE = LeanShape(Table, migrate=Table.migrate_legacy_fields, legacy_fields=("number",))
+TAX_RATE_SHAPE = LeanShape(TaxRate)
+SERVICE_CHARGE_SHAPE = LeanShape(ServiceCharge)
+GRATUITY_RULE_SHAPE = LeanShape(GratuityRule)
+DISCOUNT_POLICY_SHAPE = LeanShape(DiscountPolicy)
+
+# Database indexes
+# Every index the hot paths rely on. ensure_indexes() applies them idempotently at startup and
+# db_indexes.py reports missing or unused ones.
+INDEX_SPECS = [
+    {"collection": "users", "keys": [("id", ASCENDING)], "unique": True},
+    {"collection": "users", "keys": [("pin_fingerprint", ASCENDING)], "unique": True,
+     "partialFilterExpression": {"pin_fingerprint": {"$exists": True}}},
+    {"collection": "orders", "keys": [("id", ASCENDING)], "unique": True},
+    {"collection": "orders", "keys": [("status", ASCENDING), ("created_at", DESCENDING)]},
+    {"collection": "orders", "keys": [("created_by", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)]},
+    {"collection": "orders", "keys": [("table_id", ASCENDING)]},
+    {"collection": "orders", "keys": [("created_at", DESCENDING), ("id", DESCENDING)]},
+    {"collection": "orders", "keys": [("updated_at", ASCENDING)]},
+    {"collection": "orders", "keys": [("customer_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]},
+    {"collection": "order_tombstones", "keys": [("deleted_at", ASCENDING)],
+     "expireAfterSeconds": ORDER_TOMBSTONE_TTL},
+    {"collection": "order_tombstones", "keys": [("order_oid", ASCENDING)]},
+    {"collection": "tables", "keys": [("id", ASCENDING)], "unique": True},
+    {"collection": "tables", "keys": [("name", ASCENDING)]},
+    {"collection": "customers", "keys": [("id", ASCENDING)], "unique": True},
+    {"collection": "customers", "keys": [("phone_normalized", ASCENDING)], "unique": True,
+     "partialFilterExpression": {"phone_normalized": {"$exists": True}}},
+    {"collection": "customers", "keys": [("search_tokens", ASCENDING)]},
+    {"collection": "customers", "keys": [("total_orders", DESCENDING), ("name", ASCENDING)]},
+    {"collection": "customers", "keys": [("updated_at", DESCENDING)]},
+    {"collection": "menu_items", "keys": [("id", ASCENDING)], "unique": True},
+    {"collection": "modifier_groups", "keys": [("id", ASCENDING)], "unique": True},
+    {"collection": "modifiers", "keys": [("id", ASCENDING)], "unique": True},
+    {"collection": "modifiers", "keys": [("group_id", ASCENDING)]},
+    {"collection": "time_entries", "keys": [("id", ASCENDING)], "unique": True},
+    {"collection": "time_entries", "keys": [("user_id", ASCENDING), ("date", ASCENDING), ("clock_out", ASCENDING)]},
+    {"collection": "tax_rates", "keys": [("id", ASCENDING)], "unique": True},
+    {"collection": "service_charges", "keys": [("id", ASCENDING)], "unique": True},
+    {"collection": "gratuity_rules", "keys": [("id", ASCENDING)], "unique": True},
+    {"collection": "discount_policies", "keys": [("id", ASCENDING)], "unique": True},
+]
+
+async def ensure_indexes() -> List[str]:
+    """Create any missing declared index; returns the specs that could not be built"""
+    failed = []
+    for spec in INDEX_SPECS:
+        options = {k: v for k, v in spec.items() if k not in ("collection", "keys")}
+        try:
+            await db[spec["collection"]].create_index(spec["keys"], **options)
+        except OperationFailure as e:
+            # e.g. duplicate phone numbers blocking a unique index; keep serving and report it
+            description = f"{spec['collection']} {spec['keys']}"
+            logger.warning(f"Could not ensure index {description}: {e}")
+            failed.append(description)
+    return failed
+
+# Tax & charge rule engine
+TAX_CHARGES_VERSION_KEY = "tax_charges_version"  # db.counters document bumped on every /tax-charges write
+
+def rule_applies_to_order_type(rule: Dict, order_type: str) -> bool:
+    """A rule with no (or an empty) applies_to_order_types list applies to every order type"""
+    order_types = rule.get("applies_to_order_types")
+    return not order_types or order_type in order_types
+
+class ChargeRuleSet:
+    """Snapshot of all active tax/charge rules, pre-bucketed per order type"""
+    
+    def __init__(self, tax_rates: List[Dict], service_charges: List[Dict],
+                 gratuity_rules: List[Dict], discount_policies: List[Dict]):
+        self.tax_rates = tax_rates
+        self.service_charges = service_charges
+        self.gratuity_rules = gratuity_rules
+        self.discount_policies = {policy["id"]: policy for policy in discount_policies}
+        self.loaded_at = time.monotonic()
+        self._buckets = {order_type.value: self._bucket(order_type.value) for order_type in OrderType}
+    
+    def _bucket(self, order_type: str) -> Dict[str, List[Dict]]:
+        return {
+            "tax_rates": [r for r in self.tax_rates if rule_applies_to_order_type(r, order_type)],
+            "service_charges": [r for r in self.service_charges if rule_applies_to_order_type(r, order_type)],
+            "gratuity_rules": [r for r in self.gratuity_rules if rule_applies_to_order_type(r, order_type)]
+        }
     
-    for tax_rate in tax_rates:
-        if tax_rate["type"] == "percentage":
-            total_tax += subtotal * (tax_rate["rate"] / 100)
-        else:  # fixed
-            total_tax += tax_rate["rate"]
-    
-    # Get active service charges that apply to this order type
-    # Include charges that either:
-    # 1. Have empty applies_to_order_types array (apply to all order types)
-    # 2. Have the current order_type in their applies_to_order_types array
-    service_charges = await db.service_charges.find({
-        "active": True,
-        "$or": [
-            {"applies_to_order_types": {"$exists": False}},    # Field doesn't exist
-            {"applies_to_order_types": {"$size": 0}},          # Empty array (apply to all)
-            {"applies_to_order_types": {"$in": [order_type]}}  # Contains this order type
-        ]
-    }).to_list(1000)
+    def for_order_type(self, order_type: str) -> Dict[str, List[Dict]]:
+        bucket = self._buckets.get(order_type)
+        return bucket if bucket is not None else self._bucket(order_type)
     
-    for charge in service_charges:
-        # Determine what amount to check against based on applies_to_subtotal field
-        if charge.get("applies_to_subtotal", True):
-            # Apply conditions based on subtotal
-            check_amount = subtotal
-        else:
-            # Apply conditions based on total (subtotal + tax)
-            check_amount = subtotal + total_tax
+    def price(self, subtotal: float, order_type: str, party_size: int = 1,
+              applied_discounts: List[str] = None) -> Dict[str, Any]:
+        """Calculate taxes, service charges, gratuity, and discounts with a per-rule breakdown"""
+        bucket = self.for_order_type(order_type)
         
-        # Check if charge meets minimum order requirements
-        minimum_amount = charge.get("minimum_order_amount", 0)
-        if minimum_amount > 0 and check_amount < minimum_amount:
-            continue
-            
-        # Check if charge meets maximum order requirements  
-        maximum_amount = charge.get("maximum_order_amount", 0)
-        if maximum_amount > 0 and check_amount > maximum_amount:
-            continue
+        total_tax = 0.0
+        total_service_charges = 0.0
+        total_gratuity = 0.0
+        total_discounts = 0.0
+        tax_breakdown = []
+        service_charge_breakdown = []
+        gratuity_breakdown = []
+        discount_breakdown = []
+        
+        for tax_rate in bucket["tax_rates"]:
+            if tax_rate["type"] == "percentage":
+                tax_amount = subtotal * (tax_rate["rate"] / 100)
+            else:  # fixed
+                tax_amount = tax_rate["rate"]
             
-        # Apply the charge to the appropriate base amount
-        if charge["type"] == "percentage":
+            total_tax += tax_amount
+            tax_breakdown.append({
+                "name": tax_rate["name"],
+                "rate": tax_rate["rate"],
+                "type": tax_rate["type"],
+                "amount": round(tax_amount, 2)
+            })
+        
+        for charge in bucket["service_charges"]:
+            # Determine what amount to check against based on applies_to_subtotal field
             if charge.get("applies_to_subtotal", True):
-                total_service_charges += subtotal * (charge["amount"] / 100)
+                # Apply conditions based on subtotal
+                check_amount = subtotal
             else:
-                # Apply percentage to total with tax
-                total_service_charges += (subtotal + total_tax) * (charge["amount"] / 100)
-        else:  # fixed
-            total_service_charges += charge["amount"]
-    
-    # Get active gratuity rules that apply to this order type and party size
-    gratuity_rules = await db.gratuity_rules.find({
-        "active": True,
-        "$or": [
-            {"applies_to_order_types": {"$exists": False}},    # Field doesn't exist
-            {"applies_to_order_types": {"$size": 0}},          # Empty array (apply to all)
-            {"applies_to_order_types": {"$in": [order_type]}}  # Contains this order type
-        ]
-    }).to_list(1000)
-    
-    for gratuity in gratuity_rules:
-        # Check minimum order amount
-        if gratuity.get("minimum_order_amount", 0) > 0 and subtotal < gratuity["minimum_order_amount"]:
-            continue
+                # Apply conditions based on total (subtotal + tax)
+                check_amount = subtotal + total_tax
             
-        # Check maximum order amount
-        if gratuity.get("maximum_order_amount", 0) > 0 and subtotal > gratuity["maximum_order_amount"]:
-            continue
+            # Check if charge meets minimum order requirements
+            minimum_amount = charge.get("minimum_order_amount", 0)
+            if minimum_amount > 0 and check_amount < minimum_amount:
+                continue
+                
+            # Check if charge meets maximum order requirements  
+            maximum_amount = charge.get("maximum_order_amount", 0)
+            if maximum_amount > 0 and check_amount > maximum_amount:
+                continue
+                
+            # Apply the charge to the appropriate base amount
+            if charge["type"] == "percentage":
+                charge_amount = check_amount * (charge["amount"] / 100)
+            else:  # fixed
+                charge_amount = charge["amount"]
             
-        # Check party size requirement
-        if gratuity.get("party_size_minimum", 0) > 0 and party_size < gratuity["party_size_minimum"]:
-            continue
+            total_service_charges += charge_amount
+            service_charge_breakdown.append({
+                "name": charge["name"],
+                "amount": charge["amount"],
+                "type": charge["type"],
+                "calculated_amount": round(charge_amount, 2),
+                "mandatory": charge.get("mandatory", False),
+                "applies_to_subtotal": charge.get("applies_to_subtotal", True),
+                "check_amount": round(check_amount, 2),
+                "minimum_order_amount": minimum_amount,
+                "maximum_order_amount": maximum_amount
+            })
+        
+        for gratuity in bucket["gratuity_rules"]:
+            # Check minimum order amount
+            if gratuity.get("minimum_order_amount", 0) > 0 and subtotal < gratuity["minimum_order_amount"]:
+                continue
+                
+            # Check maximum order amount
+            if gratuity.get("maximum_order_amount", 0) > 0 and subtotal > gratuity["maximum_order_amount"]:
+                continue
+                
+            # Check party size requirement
+            if gratuity.get("party_size_minimum", 0) > 0 and party_size < gratuity["party_size_minimum"]:
+                continue
+                
+            if gratuity["type"] == "percentage":
+                gratuity_amount = subtotal * (gratuity["amount"] / 100)
+            else:  # fixed
+                gratuity_amount = gratuity["amount"]
             
-        if gratuity["type"] == "percentage":
-            total_gratuity += subtotal * (gratuity["amount"] / 100)
-        else:  # fixed
-            total_gratuity += gratuity["amount"]
-    
-    # Calculate applied discounts
-    if applied_discounts:
-        discount_policies = await db.discount_policies.find({
-            "id": {"$in": applied_discounts},
-            "active": True
-        }).to_list(1000)
+            total_gratuity += gratuity_amount
+            gratuity_breakdown.append({
+                "name": gratuity["name"],
+                "amount": gratuity["amount"],
+                "type": gratuity["type"],
+                "calculated_amount": round(gratuity_amount, 2),
+                "party_size_minimum": gratuity.get("party_size_minimum", 0)
+            })
         
-        for discount in discount_policies:
+        for discount_id in dict.fromkeys(applied_discounts or []):
+            discount = self.discount_policies.get(discount_id)
+            if not discount:
+                continue
+            
             # Check minimum order requirement
             if discount.get("minimum_order_amount", 0) > 0 and subtotal < discount["minimum_order_amount"]:
                 continue
                 
             # Check order type if specified
-            discount_order_types = discount.get("applies_to_order_types", [])
-            if discount_order_types and order_type not in discount_order_types:
+            if not rule_applies_to_order_type(discount, order_type):
                 continue
                 
             if discount["type"] == "percentage":
                 discount_amount = subtotal * (discount["amount"] / 100)
             else:  # fixed
                 discount_amount = discount["amount"]
-                
+            
             total_discounts += discount_amount
+            discount_breakdown.append({
+                "id": discount["id"],
+                "name": discount["name"],
+                "amount": discount["amount"],
+                "type": discount["type"],
+                "calculated_amount": round(discount_amount, 2)
+            })
+        
+        return {
+            "tax": total_tax,
+            "service_charges": total_service_charges,
+            "gratuity": total_gratuity,
+            "discounts": total_discounts,
+            "breakdown": {
+                "tax_breakdown": tax_breakdown,
+                "service_charge_breakdown": service_charge_breakdown,
+                "suggested_gratuity": gratuity_breakdown,
+                "discount_breakdown": discount_breakdown
+            }
+        }
+
+    def price_batch(self, subtotals: List[float], order_types: List[str], party_sizes: List[int],
+                    applied_discounts: List[List[str]]) -> Dict[str, np.ndarray]:
+        """Vectorized price() over many quotes; every amount is rounded to whole cents per rule"""
+        subtotal_cents = np.rint(np.asarray(subtotals, dtype=np.float64) * 100).astype(np.int64)
+        order_types = np.asarray(order_types, dtype=object)
+        party_sizes = np.asarray(party_sizes, dtype=np.int64)
+        count = len(subtotal_cents)
+        
+        def cents(amount: float) -> int:
+            return int(round(amount * 100))
+        
+        def order_type_mask(rule: Dict) -> np.ndarray:
+            order_types_for_rule = rule.get("applies_to_order_types")
+            if not order_types_for_rule:
+                return np.ones(count, dtype=bool)
+            return np.isin(order_types, list(order_types_for_rule))
+        
+        def amount_cents(rule_type: str, amount: float, base_cents: np.ndarray) -> np.ndarray:
+            if rule_type == "percentage":
+                return np.rint(base_cents * (amount / 100)).astype(np.int64)
+            return np.full(count, cents(amount), dtype=np.int64)
+        
+        def within_limits(rule: Dict, check_cents: np.ndarray) -> np.ndarray:
+            mask = np.ones(count, dtype=bool)
+            minimum_amount = rule.get("minimum_order_amount", 0)
+            if minimum_amount > 0:
+                mask &= check_cents >= cents(minimum_amount)
+            maximum_amount = rule.get("maximum_order_amount", 0)
+            if maximum_amount > 0:
+                mask &= check_cents <= cents(maximum_amount)
+            return mask
+        
+        tax_cents = np.zeros(count, dtype=np.int64)
+        for tax_rate in self.tax_rates:
+            mask = order_type_mask(tax_rate)
+            tax_cents += np.where(mask, amount_cents(tax_rate["type"], tax_rate["rate"], subtotal_cents), 0)
+        
+        service_charge_cents = np.zeros(count, dtype=np.int64)
+        for charge in self.service_charges:
+            check_cents = subtotal_cents if charge.get("applies_to_subtotal", True) else subtotal_cents + tax_cents
+            mask = order_type_mask(charge) & within_limits(charge, check_cents)
+            service_charge_cents += np.where(mask, amount_cents(charge["type"], charge["amount"], check_cents), 0)
+        
+        gratuity_cents = np.zeros(count, dtype=np.int64)
+        for gratuity in self.gratuity_rules:
+            mask = order_type_mask(gratuity) & within_limits(gratuity, subtotal_cents)
+            party_size_minimum = gratuity.get("party_size_minimum", 0)
+            if party_size_minimum > 0:
+                mask &= party_sizes >= party_size_minimum
+            gratuity_cents += np.where(mask, amount_cents(gratuity["type"], gratuity["amount"], subtotal_cents), 0)
+        
+        discount_cents = np.zeros(count, dtype=np.int64)
+        requested_discounts = [set(ids) for ids in applied_discounts]
+        for discount_id, discount in self.discount_policies.items():
+            requested = np.fromiter((discount_id in ids for ids in requested_discounts), dtype=bool, count=count)
+            if not requested.any():
+                continue
+            minimum_amount = discount.get("minimum_order_amount", 0)
+            mask = requested & order_type_mask(discount)
+            if minimum_amount > 0:
+                mask &= subtotal_cents >= cents(minimum_amount)
+            discount_cents += np.where(mask, amount_cents(discount["type"], discount["amount"], subtotal_cents), 0)
+        
+        return {
+            "subtotal": subtotal_cents,
+            "tax": tax_cents,
+            "service_charges": service_charge_cents,
+            "gratuity": gratuity_cents,
+            "discounts": discount_cents
+        }
+
+class ChargeRuleEngine:
+    """Serves active rules from memory, reloading when the shared config version moves on"""
+    
+    def __init__(self, ttl: float, version_check: float):
+        self.ttl = ttl
+        self.version_check = version_check
+        self._rules: Optional[ChargeRuleSet] = None
+        self._rules_version: Optional[int] = None  # Config version the cached rules were loaded at
+        self._version: Optional[int] = None  # Latest shared config version seen by this worker
+        self._version_seen_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._snapshot: Optional[tuple[int, float, bytes, str]] = None  # (config version, built at, body, ETag)
+    
+    def _is_fresh(self, rules: Optional[ChargeRuleSet], version: int) -> bool:
+        return (rules is not None and self._rules_version == version
+                and time.monotonic() - rules.loaded_at < self.ttl)
+    
+    async def get_rules(self) -> ChargeRuleSet:
+        version = self._version
+        if version is None or time.monotonic() - self._version_seen_at >= self.version_check:
+            # Writes handled by other workers are picked up within version_check seconds
+            version = await self.version()
+            self.observe_version(version)
+        rules = self._rules
+        if self._is_fresh(rules, version):
+            return rules
+        
+        async with self._lock:
+            if self._is_fresh(self._rules, version):
+                return self._rules
+            
+            generation = self._generation
+            tax_rates, service_charges, gratuity_rules, discount_policies = await asyncio.gather(
+                db.tax_rates.find({"active": True}).to_list(1000),
+                db.service_charges.find({"active": True}).to_list(1000),
+                db.gratuity_rules.find({"active": True}).to_list(1000),
+                db.discount_policies.find({"active": True}).to_list(1000)
+            )
+            rules = ChargeRuleSet(tax_rates, service_charges, gratuity_rules, discount_policies)
+            # Don't publish a snapshot that raced with a write; the next caller reloads
+            if generation == self._generation:
+                self._rules = rules
+                self._rules_version = version
+            return rules
+    
+    def invalidate(self):
+        self._generation += 1
+        self._rules = None
+    
+    def observe_version(self, version: int):
+        """Note the shared config version, e.g. from a config change event; a newer one reloads the rules"""
+        if self._version is None or version >= self._version:
+            self._version = version
+            self._version_seen_at = time.monotonic()
+    
+    async def record_change(self) -> int:
+        """Call after every /tax-charges write: drops the cached rules and bumps the shared config version"""
+        self.invalidate()
+        counter = await db.counters.find_one_and_update(
+            {"_id": TAX_CHARGES_VERSION_KEY},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self.observe_version(counter["seq"])
+        emit_config_event("tax_charges.changed", counter["seq"])
+        return counter["seq"]
     
-    return total_tax, total_service_charges, total_gratuity, total_discounts
+    async def version(self) -> int:
+        counter = await db.counters.find_one({"_id": TAX_CHARGES_VERSION_KEY}, {"seq": 1})
+        return counter["seq"] if counter else 0
+    
+    async def snapshot(self, version: int) -> tuple[bytes, str]:
+        """All tax/charge rules (active or not) as one JSON payload and its ETag.
+        
+        Rebuilt when the config version moves on or after the TTL, so writes made outside the API
+        show up too. The ETag hashes the rules themselves, not the version.
+        """
+        snapshot = self._snapshot
+        if snapshot and snapshot[0] == version and time.monotonic() - snapshot[1] < self.ttl:
+            return snapshot[2], snapshot[3]
+        
+        tax_rates, service_charges, gratuity_rules, discount_policies = await asyncio.gather(
+            db.tax_rates.find({}, TAX_RATE_SHAPE.projection).sort("created_at", -1).to_list(1000),
+            db.service_charges.find({}, SERVICE_CHARGE_SHAPE.projection).sort("created_at", -1).to_list(1000),
+            db.gratuity_rules.find({}, GRATUITY_RULE_SHAPE.projection).sort("created_at", -1).to_list(1000),
+            db.discount_policies.find({}, DISCOUNT_POLICY_SHAPE.projection).sort("created_at", -1).to_list(1000)
+        )
+        rules_data = {
+            "tax_rates": TAX_RATE_SHAPE.shape_all(tax_rates),
+            "service_charges": SERVICE_CHARGE_SHAPE.shape_all(service_charges),
+            "gratuity_rules": GRATUITY_RULE_SHAPE.shape_all(gratuity_rules),
+            "discount_policies": DISCOUNT_POLICY_SHAPE.shape_all(discount_policies)
+        }
+        etag = '"tax-charges-' + hashlib.sha1(render_json(rules_data)).hexdigest() + '"'
+        body = render_json({"version": version, **rules_data})
+        self._snapshot = (version, time.monotonic(), body, etag)
+        return body, etag
+
+charge_rules = ChargeRuleEngine(CHARGE_RULES_TTL, CHARGE_RULES_VERSION_CHECK)
+
+async def calculate_order_pricing(subtotal: float, order_type: str, party_size: int = 1, 
+                                  applied_discounts: List[str] = None) -> Dict[str, Any]:
+    """Calculate dynamic taxes, service charges, gratuity, and discounts for an order"""
+    rules = await charge_rules.get_rules()
+    return rules.price(subtotal, order_type, party_size, applied_discounts)
+
+# Menu catalog cache
+MENU_VERSION_KEY = "menu_version"  # db.counters document bumped on every menu/modifier write
+
+class MenuCatalogSnapshot:
+    """Immutable view of the menu with lookup indexes, validated once at build time"""
+    
+    def __init__(self, version: int, items: List[Dict], groups: List[Dict], modifiers: List[Dict]):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        
+        self.items = [MenuItem(**item) for item in items]
+        self.available_items = [item for item in self.items if item.available]
+        self.items_by_id = {item.id: item for item in self.items}
+        self.items_by_category: Dict[str, List[MenuItem]] = {}
+        for item in self.items:
+            self.items_by_category.setdefault(item.category, []).append(item)
+        self.categories = sorted(self.items_by_category)
+        
+        self.modifier_groups = [ModifierGroup(**group) for group in groups]
+        self.groups_by_id = {group.id: group for group in self.modifier_groups}
+        
+        self.modifiers = [Modifier(**modifier) for modifier in modifiers]
+        self.modifiers_by_id = {modifier.id: modifier for modifier in self.modifiers}
+        self.modifiers_by_group: Dict[str, List[Modifier]] = {}
+        for modifier in self.modifiers:
+            self.modifiers_by_group.setdefault(modifier.group_id, []).append(modifier)
+        
+        # Pre-serialized /menu/snapshot payload. The ETag only covers the menu data, so
+        # workers holding identical menus agree on it even if their versions differ.
+        menu_data = {
+            "items": [item.dict() for item in self.available_items],
+            "categories": self.categories,
+            "modifier_groups": [group.dict() for group in self.modifier_groups],
+            "modifiers": [modifier.dict() for modifier in self.modifiers]
+        }
+        self.etag = '"menu-' + hashlib.sha1(render_json(menu_data)).hexdigest() + '"'
+        self.snapshot_body = render_json({"version": version, "etag": self.etag, **menu_data})
+
+class MenuCatalog:
+    """In-process menu cache keyed on a shared version counter that every menu or modifier write bumps"""
+    
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._snapshot: Optional[MenuCatalogSnapshot] = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+    
+    def _is_fresh(self, snapshot: Optional[MenuCatalogSnapshot], version: int) -> bool:
+        return (snapshot is not None and snapshot.version == version
+                and time.monotonic() - snapshot.loaded_at < self.ttl)
+    
+    async def version(self) -> int:
+        counter = await db.counters.find_one({"_id": MENU_VERSION_KEY}, {"seq": 1})
+        return counter["seq"] if counter else 0
+    
+    async def get(self) -> MenuCatalogSnapshot:
+        # One _id lookup per call so writes handled by other workers are seen immediately
+        version = await self.version()
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot, version):
+            return snapshot
+        
+        async with self._lock:
+            if self._is_fresh(self._snapshot, version):
+                return self._snapshot
+            
+            generation = self._generation
+            items, groups, modifiers = await asyncio.gather(
+                db.menu_items.find().to_list(None),
+                db.modifier_groups.find().to_list(None),
+                db.modifiers.find().to_list(None)
+            )
+            snapshot = MenuCatalogSnapshot(version, items, groups, modifiers)
+            # Don't publish a snapshot that raced with a write; the next caller rebuilds
+            if generation == self._generation:
+                self._snapshot = snapshot
+            return snapshot
+    
+    async def reload(self) -> MenuCatalogSnapshot:
+        """Call after every menu/modifier write: bumps the shared version and rebuilds"""
+        self._generation += 1
+        self._snapshot = None
+        await db.counters.update_one({"_id": MENU_VERSION_KEY}, {"$inc": {"seq": 1}}, upsert=True)
+        return await self.get()
+
+menu_catalog = MenuCatalog(MENU_CATALOG_TTL)
+
+# Order number sequence
+class OrderNumberSequence:
+    """Hands out order numbers from an atomic counter in db.counters"""
+    
+    def __init__(self, block_size: int, reset: str, location: str):
+        self.block_size = block_size
+        self.reset = reset
+        self.location = location
+        self._key: Optional[str] = None
+        self._next = 1
+        self._end = 0  # Last number of the reserved block
+        self._lock = asyncio.Lock()
+    
+    def counter_key(self) -> str:
+        key = "order_number"
+        if self.location:
+            key += f":{self.location}"
+        if self.reset == "daily":
+            key += f":{datetime.now(EDT).date().isoformat()}"
+        return key
+    
+    def format(self, number: int) -> str:
+        if self.location:
+            return f"ORD-{self.location}-{number:04d}"
+        return f"ORD-{number:04d}"
+    
+    async def seed(self):
+        """Start a never-resetting counter after the existing orders instead of at ORD-0001"""
+        if self.reset == "daily":
+            return
+        key = self.counter_key()
+        if await db.counters.find_one({"_id": key}):
+            return
+        order_count = await db.orders.count_documents({})
+        try:
+            await db.counters.update_one({"_id": key}, {"$setOnInsert": {"seq": order_count}}, upsert=True)
+        except DuplicateKeyError:
+            pass  # Another worker seeded it first
+    
+    async def _reserve_block(self, key: str):
+        counter = await db.counters.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"seq": self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._key = key
+        self._end = counter["seq"]
+        self._next = self._end - self.block_size + 1
+    
+    async def next_number(self) -> str:
+        # Numbers left in a block when a worker restarts are skipped, never reused
+        async with self._lock:
+            key = self.counter_key()
+            if key != self._key or self._next > self._end:
+                await self._reserve_block(key)
+            number = self._next
+            self._next += 1
+        return self.format(number)
+
+order_numbers = OrderNumberSequence(ORDER_NUMBER_BLOCK_SIZE, ORDER_NUMBER_RESET, ORDER_NUMBER_LOCATION)
+
+async def fetch_documents_by_id(collection, ids) -> Dict[str, Dict]:
+    """Fetch many documents with a single $in query, keyed by id"""
+    if not ids:
+        return {}
+    documents = await collection.find({"id": {"$in": list(ids)}}).to_list(None)
+    return {document["id"]: document for document in documents}
+
+async def build_order_items(items_data: List[Dict]) -> tuple[List[OrderItem], float]:
+    """Resolve cart lines against the menu catalog, then price them in memory"""
+    menu_item_ids = {item_data["menu_item_id"] for item_data in items_data}
+    modifier_ids = {
+        modifier_data["modifier_id"]
+        for item_data in items_data
+        for modifier_data in item_data.get("modifiers", [])
+    }
+    catalog = await menu_catalog.get()
+    menu_items = {item_id: catalog.items_by_id[item_id] for item_id in menu_item_ids if item_id in catalog.items_by_id}
+    modifiers_by_id = {mod_id: catalog.modifiers_by_id[mod_id] for mod_id in modifier_ids if mod_id in catalog.modifiers_by_id}
+    
+    # Anything the catalog doesn't know yet (e.g. written through another worker) comes from one $in query each
+    missing_items, missing_modifiers = await asyncio.gather(
+        fetch_documents_by_id(db.menu_items, menu_item_ids - menu_items.keys()),
+        fetch_documents_by_id(db.modifiers, modifier_ids - modifiers_by_id.keys())
+    )
+    menu_items.update({item_id: MenuItem(**item) for item_id, item in missing_items.items()})
+    modifiers_by_id.update({mod_id: Modifier(**modifier) for mod_id, modifier in missing_modifiers.items()})
+    
+    processed_items = []
+    subtotal = 0
+    
+    for item_data in items_data:
+        menu_item = menu_items.get(item_data["menu_item_id"])
+        if not menu_item:
+            raise HTTPException(status_code=404, detail=f"Menu item not found: {item_data['menu_item_id']}")
+        
+        # Process modifiers
+        modifiers = []
+        modifier_total = 0
+        
+        for modifier_data in item_data.get("modifiers", []):
+            modifier = modifiers_by_id.get(modifier_data["modifier_id"])
+            if modifier:
+                modifiers.append(OrderItemModifier(
+                    modifier_id=modifier.id,
+                    name=modifier.name,
+                    price=modifier.price
+                ))
+                modifier_total += modifier.price
+        
+        item_total = (menu_item.price + modifier_total) * item_data["quantity"]
+        
+        order_item = OrderItem(
+            menu_item_id=menu_item.id,
+            menu_item_name=menu_item.name,
+            quantity=item_data["quantity"],
+            base_price=menu_item.price,
+            modifiers=modifiers,
+            special_instructions=item_data.get("special_instructions", ""),
+            total_price=item_total
+        )
+        
+        processed_items.append(order_item)
+        subtotal += item_total
+    
+    return processed_items, subtotal
+
+# Order listing helpers
+# Active orders include pending (pay later) and processing statuses
+ACTIVE_ORDER_STATUSES = ["pending", "confirmed", "preparing", "ready", "out_for_delivery"]
+
+ORDER_SUMMARY_PROJECTION = {"_id": 0, **{field: 1 for field in OrderSummary.__fields__}}
+ORDER_HISTORY_PROJECTION = {**ORDER_SUMMARY_PROJECTION, "payment_method": 1, "items.menu_item_name": 1, "items.quantity": 1}
+
+def encode_order_cursor(order: Dict) -> str:
+    position = {"created_at": order["created_at"].isoformat(), "id": order["id"]}
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+def decode_order_cursor(cursor: str) -> Dict:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return {"created_at": datetime.fromisoformat(position["created_at"]), "id": position["id"]}
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def fetch_order_page(query: Dict, limit: Optional[int], cursor: Optional[str],
+                           projection: Dict = ORDER_SUMMARY_PROJECTION, model=OrderSummary) -> Dict:
+    """One page of order summaries, newest first, keyed on (created_at, id)"""
+    limit = min(max(1, limit or ORDER_PAGE_SIZE), ORDER_PAGE_SIZE_MAX)
+    if cursor:
+        position = decode_order_cursor(cursor)
+        query = {"$and": [query, {"$or": [
+            {"created_at": {"$lt": position["created_at"]}},
+            {"created_at": position["created_at"], "id": {"$lt": position["id"]}}
+        ]}]}
+    
+    # Fetch one extra row to know whether another page exists
+    orders = await db.orders.find(query, projection).sort(
+        [("created_at", DESCENDING), ("id", DESCENDING)]
+    ).to_list(limit + 1)
+    
+    next_cursor = encode_order_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return {"orders": [model(**order) for order in orders[:limit]], "next_cursor": next_cursor}
+
+def history_date_range(date_filter: Optional[str], start_date: Optional[str],
+                       end_date: Optional[str]) -> tuple[Optional[datetime], Optional[datetime]]:
+    """UTC [start, end) bounds for a history filter, using restaurant (EDT) calendar days"""
+    def edt_midnight_utc(day) -> datetime:
+        return EDT.localize(datetime(day.year, day.month, day.day)).astimezone(pytz.UTC)
+    
+    today = get_current_time().astimezone(EDT).date()
+    if not date_filter or date_filter == "all":
+        return None, None
+    if date_filter == "today":
+        return edt_midnight_utc(today), None
+    if date_filter == "week":
+        # Weeks start on Monday
+        return edt_midnight_utc(today - timedelta(days=today.weekday())), None
+    if date_filter == "month":
+        return edt_midnight_utc(today.replace(day=1)), None
+    if date_filter == "custom":
+        try:
+            start = edt_midnight_utc(datetime.strptime(start_date, "%Y-%m-%d")) if start_date else None
+            # end_date is inclusive, so the bound is the following midnight
+            end = edt_midnight_utc(datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)) if end_date else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Dates must be formatted as YYYY-MM-DD")
+        return start, end
+    raise HTTPException(status_code=400, detail="Invalid date filter")
+
+async def record_order_tombstone(order: Dict):
+    """Remember a deleted order so delta-syncing terminals can drop it.
+    
+    Written before the delete: the change-stream watcher resolves delete events (which only
+    carry the document _id) to the order and its owner through order_oid.
+    """
+    await db.order_tombstones.insert_one({
+        "order_id": order["id"],
+        "order_oid": order.get("_id"),
+        "created_by": order.get("created_by"),
+        "deleted_at": get_current_time()
+    })
+
+def encode_sync_cursor(position: datetime, ids: List[str]) -> str:
+    payload = {"t": position.isoformat(), "ids": ids}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+def decode_sync_cursor(cursor: str) -> tuple[datetime, List[str]]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(payload["t"]), list(payload["ids"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def fetch_active_orders_delta(scope: Dict, since: Optional[str]) -> Dict:
+    """Active orders changed since a sync cursor, plus ids of orders that left the active set.
+    
+    The cursor is (updated_at, ids already sent at exactly that instant) and never advances past
+    now - ORDER_SYNC_SKEW_SECONDS, so an order can be sent twice and clients upsert by id.
+    """
+    # Stored datetimes come back naive UTC
+    now = get_current_time().replace(tzinfo=None)
+    horizon = now - timedelta(seconds=ORDER_SYNC_SKEW_SECONDS)
+    
+    position, seen_ids = decode_sync_cursor(since) if since else (None, [])
+    if position is None or position < now - timedelta(seconds=ORDER_TOMBSTONE_TTL):
+        # First sync, or tombstones for this cursor may have expired
+        orders = await db.orders.find(
+            {**scope, "status": {"$in": ACTIVE_ORDER_STATUSES}}, ORDER_SHAPE.projection
+        ).sort("created_at", -1).to_list(1000)
+        return {
+            "orders": ORDER_SHAPE.shape_all(orders),
+            "removed_ids": [],
+            "cursor": encode_sync_cursor(horizon, []),
+            "reset": True
+        }
+    
+    changed = await db.orders.find({**scope, "$or": [
+        {"updated_at": {"$gt": position}},
+        {"updated_at": position, "id": {"$nin": seen_ids}}
+    ]}, ORDER_SHAPE.projection).sort("updated_at", 1).to_list(None)
+    tombstone_scope = {"created_by": scope["created_by"]} if "created_by" in scope else {}
+    tombstones = await db.order_tombstones.find(
+        {**tombstone_scope, "deleted_at": {"$gte": position}}, {"_id": 0, "order_id": 1}
+    ).to_list(None)
+    
+    orders = [ORDER_SHAPE.shape(order) for order in changed if order.get("status") in ACTIVE_ORDER_STATUSES]
+    removed_ids = [order["id"] for order in changed if order.get("status") not in ACTIVE_ORDER_STATUSES]
+    removed_ids += [tombstone["order_id"] for tombstone in tombstones]
+    
+    next_position = max(position, horizon)
+    next_ids = [order["id"] for order in changed if order.get("updated_at") == next_position]
+    if next_position == position:
+        next_ids = list(set(seen_ids + next_ids))
+    return {
+        "orders": orders,
+        "removed_ids": removed_ids,
+        "cursor": encode_sync_cursor(next_position, next_ids)
+    }
+
+async def render_order_list(query: Dict) -> bytes:
+    """Full (unpaginated) order list body, newest first"""
+    orders = await db.orders.find(query, ORDER_SHAPE.projection).sort("created_at", -1).to_list(1000)
+    return render_json(ORDER_SHAPE.shape_all(orders))
+
+async def render_active_orders_sync(scope: Dict) -> bytes:
+    return render_json(await fetch_active_orders_delta(scope, None))
+
+# Customers
+def normalize_phone(phone: str) -> str:
+    """E.164-style key for a phone number: "(555) 111-2222", "555.111.2222" and "+1 555 111 2222"
+    all become "+15551112222". Numbers without a country code get DEFAULT_PHONE_COUNTRY_CODE."""
+    phone = (phone or "").strip()
+    digits = "".join(ch for ch in phone if ch.isdigit())
+    if not digits:
+        return ""
+    if phone.startswith("+"):
+        return "+" + digits
+    if phone.startswith("00"):
+        return "+" + digits[2:]
+    if DEFAULT_PHONE_COUNTRY_CODE == "1" and len(digits) == 11 and digits.startswith("1"):
+        return "+" + digits
+    return "+" + DEFAULT_PHONE_COUNTRY_CODE + digits
+
+def fold_search_text(text: Optional[str]) -> str:
+    """Casefolded text with accents dropped, so "Núñez" and "nunez" compare equal"""
+    decomposed = unicodedata.normalize("NFKD", (text or "").casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def search_tokens(*texts: Optional[str]) -> List[str]:
+    """Folded Unicode words of the given texts, in order, without repeats"""
+    tokens = []
+    for text in texts:
+        for token in re.findall(r"[^\W_]+", fold_search_text(text)):
+            if token not in tokens:
+                tokens.append(token)
+    return tokens
+
+def customer_search_tokens(customer: Dict) -> List[str]:
+    """Typeahead keys for a customer: words of the name and street address"""
+    return search_tokens(customer.get("name"), customer.get("address"))
+
+def phone_search_prefix(q: str) -> str:
+    """Normalized-phone prefix for a partially typed number.
+    
+    Unlike normalize_phone, a leading default country code is stripped rather than kept as part of
+    the number, so "1555", "555" and "+1 555" all become "+1555".
+    """
+    q = q.strip()
+    digits = "".join(ch for ch in q if ch.isdigit())
+    if q.startswith("+"):
+        return "+" + digits
+    if digits.startswith("00"):
+        return "+" + digits[2:]
+    if digits.startswith(DEFAULT_PHONE_COUNTRY_CODE):
+        digits = digits[len(DEFAULT_PHONE_COUNTRY_CODE):]
+    return "+" + DEFAULT_PHONE_COUNTRY_CODE + digits
+
+def customer_search_query(q: str) -> Optional[Dict]:
+    """Index-backed filter for a typeahead query, or None when there is nothing to match.
+    
+    Every word must prefix-match a name/address token; a query that looks like a phone
+    number also prefix-matches the normalized phone.
+    """
+    tokens = search_tokens(q)
+    if not tokens:
+        return None
+    token_filter = {"$and": [{"search_tokens": {"$regex": f"^{re.escape(token)}"}} for token in tokens]}
+    if re.fullmatch(r"[\d\s().+-]+", q.strip()):
+        phone_prefix = phone_search_prefix(q)
+        return {"$or": [
+            {"phone_normalized": {"$exists": True, "$regex": f"^{re.escape(phone_prefix)}"}},
+            token_filter
+        ]}
+    return token_filter
+
+async def upsert_customer(phone: str, details: Dict, defaults: Optional[Dict] = None) -> Dict:
+    """Find-or-create the customer for a phone number in one round trip.
+    
+    `details` (empty values skipped) overwrite an existing customer's fields; `defaults` only
+    fill in a newly created one. Concurrent callers for the same number get the same customer.
+    """
+    phone_normalized = normalize_phone(phone)
+    if not phone_normalized:
+        raise HTTPException(status_code=400, detail="Invalid phone number")
+    
+    updates = {k: v for k, v in details.items() if v}
+    if updates:
+        updates["updated_at"] = get_current_time()
+    new_customer = Customer(**{"name": "", **(defaults or {}), **updates, "phone": phone}).dict()
+    new_customer["search_tokens"] = customer_search_tokens(new_customer)
+    update = {"$setOnInsert": {k: v for k, v in new_customer.items() if k not in updates}}
+    if updates:
+        update["$set"] = updates
+    
+    for attempt in range(2):
+        try:
+            customer = await db.customers.find_one_and_update(
+                {"phone_normalized": phone_normalized}, update,
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+            break
+        except DuplicateKeyError:
+            # Another terminal inserted this caller between our match and insert; retry updates theirs
+            if attempt:
+                raise
+    
+    # A changed name or address on an existing customer needs fresh search keys
+    search_tokens = customer_search_tokens(customer)
+    if customer.get("search_tokens") != search_tokens:
+        await db.customers.update_one({"id": customer["id"]}, {"$set": {"search_tokens": search_tokens}})
+        customer["search_tokens"] = search_tokens
+    return customer
+
+async def backfill_customer_search_tokens():
+    """One-time migration: (re)build typeahead search_tokens with accent-folded Unicode words.
+    
+    Also rewrites tokens stored by the earlier ASCII-only tokenizer, which split accented names apart.
+    """
+    if await db.migrations.find_one({"_id": "customer_search_tokens_unicode"}):
+        return
+    
+    operations = []
+    async for customer in db.customers.find({}, {"_id": 0, "id": 1, "name": 1, "address": 1, "search_tokens": 1}):
+        tokens = customer_search_tokens(customer)
+        if customer.get("search_tokens") != tokens:
+            operations.append(UpdateOne({"id": customer["id"]}, {"$set": {"search_tokens": tokens}}))
+    for start in range(0, len(operations), 1000):
+        await db.customers.bulk_write(operations[start:start + 1000], ordered=False)
+    
+    await db.migrations.update_one(
+        {"_id": "customer_search_tokens_unicode"},
+        {"$set": {"completed_at": get_current_time(), "customers_updated": len(operations)}},
+        upsert=True
+    )
+    if operations:
+        logger.info(f"Built search tokens for {len(operations)} customers")
+
+async def backfill_customer_phone_keys():
+    """One-time migration: add phone_normalized to customers created before it existed"""
+    if await db.migrations.find_one({"_id": "customer_phone_normalized"}):
+        return
+    
+    updated = 0
+    async for customer in db.customers.find({"phone_normalized": {"$exists": False}}, {"_id": 0, "id": 1, "phone": 1}):
+        phone_normalized = normalize_phone(customer.get("phone", ""))
+        if phone_normalized:
+            await db.customers.update_one({"id": customer["id"]}, {"$set": {"phone_normalized": phone_normalized}})
+            updated += 1
+    
+    await db.migrations.update_one(
+        {"_id": "customer_phone_normalized"},
+        {"$set": {"completed_at": get_current_time(), "customers_updated": updated}},
+        upsert=True
+    )
+    if updated:
+        logger.info(f"Normalized phone numbers for {updated} customers")
+
+# Customer statistics
+def order_customer_filter(order: Dict) -> Optional[Dict]:
+    """The customer an order's stats belong to (phone-only orders are linked by backfill_order_customer_ids)"""
+    if order.get("customer_id"):
+        return {"id": order["customer_id"]}
+    return None
+
+async def record_customer_payment(order: Dict, paid_at: datetime):
+    """Count a newly paid order towards its customer's totals"""
+    customer_filter = order_customer_filter(order)
+    if customer_filter:
+        await db.customers.update_one(customer_filter, {
+            "$inc": {"total_orders": 1, "total_spent": order.get("total", 0)},
+            "$max": {"last_order_date": paid_at},
+            "$set": {"updated_at": get_current_time()}
+        })
+
+async def reverse_customer_payment(order: Dict):
+    """Undo record_customer_payment when a paid order is voided, deleted or moved out of paid.
+    
+    last_order_date can't be rolled back incrementally; the reconciliation job corrects it.
+    """
+    customer_filter = order_customer_filter(order)
+    if customer_filter:
+        await db.customers.update_one(customer_filter, {
+            "$inc": {"total_orders": -1, "total_spent": -order.get("total", 0)},
+            "$set": {"updated_at": get_current_time()}
+        })
+
+def customer_stats_summary(total_orders: int, total_spent: float, last_order_date: Optional[datetime]) -> Dict:
+    """The stats block shown for a customer, with derived recency and average order value.
+    
+    Money is rounded to cents: the incrementally kept total_spent drifts until the next reconcile.
+    """
+    total_spent = round(total_spent or 0, 2)
+    days_since_last_order = None
+    if last_order_date:
+        if last_order_date.tzinfo is None:
+            last_order_date = last_order_date.replace(tzinfo=pytz.UTC)
+        days_since_last_order = (get_current_time() - last_order_date).days
+    
+    return {
+        "total_orders": total_orders,
+        "total_spent": total_spent,
+        "last_order_date": last_order_date,
+        "days_since_last_order": days_since_last_order,
+        "average_order_value": round(total_spent / total_orders, 2) if total_orders > 0 else 0
+    }
+
+async def reconcile_customer_stats() -> Dict[str, int]:
+    """Rebuild every customer's total_orders/total_spent/last_order_date from paid orders.
+    
+    Only customers whose stored values differ are written. Payments landing while this runs can
+    be overwritten by the rebuilt values; the next run fixes them.
+    """
+    groups = await db.orders.aggregate([
+        {"$match": {"status": "paid", "customer_id": {"$nin": [None, ""]}}},
+        {"$group": {
+            "_id": "$customer_id",
+            "total_orders": {"$sum": 1},
+            "total_spent": {"$sum": "$total"},
+            # Same clock as record_customer_payment; orders paid before paid_at existed use created_at
+            "last_order_date": {"$max": {"$ifNull": ["$paid_at", "$created_at"]}}
+        }}
+    ]).to_list(None)
+    totals = {group.pop("_id"): {**group, "total_spent": round(group["total_spent"], 2)} for group in groups}
+    
+    updated = 0
+    operations = [
+        UpdateOne({"id": customer_id, "$or": [{field: {"$ne": value}} for field, value in entry.items()]},
+                  {"$set": entry})
+        for customer_id, entry in totals.items()
+    ]
+    for start in range(0, len(operations), 1000):
+        result = await db.customers.bulk_write(operations[start:start + 1000], ordered=False)
+        updated += result.modified_count
+    
+    # Customers with stats left over but no paid orders
+    stale_ids = [
+        customer["id"] async for customer in db.customers.find({"$or": [
+            {"total_orders": {"$ne": 0}}, {"total_spent": {"$ne": 0}}, {"last_order_date": {"$ne": None}}
+        ]}, {"_id": 0, "id": 1})
+        if customer["id"] not in totals
+    ]
+    reset = 0
+    for start in range(0, len(stale_ids), 1000):
+        result = await db.customers.update_many(
+            {"id": {"$in": stale_ids[start:start + 1000]}},
+            {"$set": {"total_orders": 0, "total_spent": 0.0, "last_order_date": None}}
+        )
+        reset += result.modified_count
+    return {"customers_with_orders": len(totals), "updated": updated, "reset": reset}
+
+async def backfill_order_customer_ids():
+    """One-time migration: link legacy phone-only orders to their customer by id"""
+    if await db.migrations.find_one({"_id": "order_customer_ids"}):
+        return
+    
+    phones = await db.orders.distinct("customer_phone", {
+        "customer_id": {"$in": [None, ""]},
+        "customer_phone": {"$nin": [None, ""]}
+    })
+    linked = 0
+    for start in range(0, len(phones), 1000):
+        batch = phones[start:start + 1000]
+        async for customer in db.customers.find({"phone": {"$in": batch}}, {"_id": 0, "id": 1, "phone": 1}):
+            result = await db.orders.update_many(
+                {"customer_phone": customer["phone"], "customer_id": {"$in": [None, ""]}},
+                {"$set": {"customer_id": customer["id"]}}
+            )
+            linked += result.modified_count
+    
+    await db.migrations.update_one(
+        {"_id": "order_customer_ids"},
+        {"$set": {"completed_at": get_current_time(), "orders_linked": linked}},
+        upsert=True
+    )
+    if linked:
+        logger.info(f"Linked {linked} phone-only orders to customers")
+
+async def run_customer_stats_reconciliation():
+    """Background loop: reconcile customer stats every CUSTOMER_STATS_RECONCILE_HOURS"""
+    while True:
+        await asyncio.sleep(CUSTOMER_STATS_RECONCILE_HOURS * 3600)
+        try:
+            result = await reconcile_customer_stats()
+            logger.info(f"Reconciled customer stats: {result}")
+        except Exception as e:
+            logger.warning(f"Customer stats reconciliation failed: {e}")
+
+# Live events
+LIVE_EVENT_TOPICS = ("orders", "tables", "config")
+
+class LiveEventBus:
+    """In-process pub/sub fanning change events out to per-topic subscriber queues"""
+    
+    def __init__(self, queue_size: int = LIVE_EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, set] = {topic: set() for topic in LIVE_EVENT_TOPICS}
+        self.published = 0
+        self.dropped = 0
+    
+    def subscribe(self, topics: List[str]) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        for topic in topics:
+            self._subscribers[topic].add(queue)
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        for subscribers in self._subscribers.values():
+            subscribers.discard(queue)
+    
+    def publish(self, topic: str, event: Dict):
+        self.published += 1
+        for queue in self._subscribers.get(topic, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled client; replace its backlog with a single resync request
+                self.dropped += 1
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"topic": topic, "type": "resync"})
+    
+    def stats(self) -> Dict:
+        return {
+            "source": LIVE_EVENTS_SOURCE,
+            "subscribers": {topic: len(subscribers) for topic, subscribers in self._subscribers.items()},
+            "published": self.published,
+            "dropped": self.dropped
+        }
+
+live_events = LiveEventBus()
+
+def order_event(event_type: str, order: Dict, **fields) -> Dict:
+    return {
+        "topic": "orders",
+        "type": event_type,
+        "id": order["id"],
+        "created_by": order.get("created_by"),
+        "table_id": order.get("table_id"),
+        **fields
+    }
+
+def emit_order_event(event_type: str, order: Dict, **fields):
+    """Publish an order change; with the change-stream source the database write is the event"""
+    if LIVE_EVENTS_SOURCE == "local":
+        live_events.publish("orders", order_event(event_type, order, **fields))
+
+def emit_table_event(event_type: str, table_id: str, **fields):
+    if LIVE_EVENTS_SOURCE == "local":
+        live_events.publish("tables", {"topic": "tables", "type": event_type, "id": table_id, **fields})
+
+def emit_config_event(event_type: str, version: int):
+    if LIVE_EVENTS_SOURCE == "local":
+        live_events.publish("config", {"topic": "config", "type": event_type, "version": version})
+
+async def watch_change_streams():
+    """Republish order/table/config writes from every worker via MongoDB change streams"""
+    sources = {
+        "orders": (db.orders, []),
+        "tables": (db.tables, []),
+        "config": (db.counters, [{"$match": {"documentKey._id": TAX_CHARGES_VERSION_KEY}}])
+    }
+    resume_tokens: Dict[str, Any] = {}
+    
+    async def to_event(topic: str, change: Dict) -> Optional[Dict]:
+        document = change.get("fullDocument") or {}
+        if topic == "orders" and change["operationType"] == "delete":
+            # Deletes carry no document; the tombstone says which order it was and who owns it
+            tombstone = await db.order_tombstones.find_one(
+                {"order_oid": change["documentKey"]["_id"]}, {"_id": 0, "order_id": 1, "created_by": 1}
+            )
+            if not tombstone:
+                return None  # Can't scope it to an owner; delta sync still drops the order
+            document = {"id": tombstone["order_id"], "created_by": tombstone["created_by"]}
+        if topic == "config":
+            # Another worker changed the rules; reload on the next pricing call rather than after the interval
+            charge_rules.observe_version(document.get("seq", 0))
+            return {"topic": topic, "type": "tax_charges.changed", "version": document.get("seq", 0)}
+        event_type = f"{topic[:-1]}.{change['operationType']}"
+        record_id = document.get("id") or str(change.get("documentKey", {}).get("_id"))
+        if topic == "orders":
+            return order_event(event_type, {**document, "id": record_id}, status=document.get("status"))
+        return {"topic": topic, "type": event_type, "id": record_id, "status": document.get("status")}
+    
+    async def watch(topic: str):
+        collection, pipeline = sources[topic]
+        while True:
+            try:
+                async with collection.watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_tokens.get(topic)
+                ) as stream:
+                    async for change in stream:
+                        resume_tokens[topic] = change["_id"]
+                        event = await to_event(topic, change)
+                        if event:
+                            live_events.publish(topic, event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"{topic} change stream interrupted, retrying: {e}")
+                await asyncio.sleep(5)
+    
+    await asyncio.gather(*(watch(topic) for topic in sources))
 
 # Routes
 
@@ -662,12 +2244,13 @@ async def calculate_order_taxes_and_charges(subtotal: float, order_type: str, pa
 @api_router.post("/auth/register")
 async def register(user_data: UserCreate):
     # Check if user exists (by PIN)
-    existing_user = await db.users.find_one({"pin": user_data.pin})
+    fingerprint = pin_fingerprint(user_data.pin)
+    existing_user = await db.users.find_one({"pin_fingerprint": fingerprint})
     if existing_user:
         raise HTTPException(status_code=400, detail="PIN already registered")
     
     # Hash PIN and create user
-    hashed_pin = hash_pin(user_data.pin)
+    hashed_pin = await pin_hasher.run(hash_pin, user_data.pin)
     user_dict = user_data.dict()
     del user_dict['pin']
     user_obj = User(**user_dict)
@@ -675,11 +2258,12 @@ async def register(user_data: UserCreate):
     # Store user with hashed PIN
     user_to_store = user_obj.dict()
     user_to_store['hashed_pin'] = hashed_pin
+    user_to_store['pin_fingerprint'] = fingerprint
     
     await db.users.insert_one(user_to_store)
     
     # Create access token
-    access_token = create_access_token(data={"sub": user_obj.id})
+    access_token = create_user_access_token(user_to_store)
     return {"access_token": access_token, "token_type": "bearer", "user": user_obj}
 
 @api_router.post("/auth/login")
@@ -688,10 +2272,10 @@ async def login(login_data: UserLogin):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid PIN")
     
-    if not user.get('is_active', True):
+    if not user_is_active(user):
         raise HTTPException(status_code=401, detail="Account is deactivated")
     
-    access_token = create_access_token(data={"sub": user['id']})
+    access_token = create_user_access_token(user)
     user_obj = User(**{k: v for k, v in user.items() if k not in ['hashed_pin', 'password']})
     return {"access_token": access_token, "token_type": "bearer", "user": user_obj}
 
@@ -713,20 +2297,18 @@ async def get_current_user(user_id: str = Depends(verify_token)):
 
 # User Management Routes
 @api_router.get("/auth/users", response_model=List[User])
-async def get_all_users(user_id: str = Depends(verify_token)):
+async def get_all_users(principal: Principal = Depends(current_principal)):
     # Only managers can access user list
-    current_user = await db.users.find_one({"id": user_id})
-    if not current_user or current_user.get('role') != 'manager':
+    if principal.role != 'manager':
         raise HTTPException(status_code=403, detail="Access denied. Manager role required.")
     
     users = await db.users.find().to_list(1000)
     return [User(**{k: v for k, v in user.items() if k not in ['hashed_pin', 'password']}) for user in users]
 
 @api_router.put("/auth/users/{target_user_id}", response_model=User)
-async def update_user(target_user_id: str, user_data: UserUpdate, user_id: str = Depends(verify_token)):
+async def update_user(target_user_id: str, user_data: UserUpdate, principal: Principal = Depends(current_principal)):
     # Only managers can update users
-    current_user = await db.users.find_one({"id": user_id})
-    if not current_user or current_user.get('role') != 'manager':
+    if principal.role != 'manager':
         raise HTTPException(status_code=403, detail="Access denied. Manager role required.")
     
     # Find target user
@@ -749,25 +2331,36 @@ async def update_user(target_user_id: str, user_data: UserUpdate, user_id: str =
     if user_data.active is not None:
         update_data['active'] = user_data.active
     if user_data.pin is not None:
+        # PINs double as login identity, so they must stay unique across users
+        fingerprint = pin_fingerprint(user_data.pin)
+        pin_owner = await db.users.find_one({"pin_fingerprint": fingerprint})
+        if pin_owner and pin_owner["id"] != target_user_id:
+            raise HTTPException(status_code=400, detail="PIN already registered")
+        
         # Hash the new PIN
-        update_data['hashed_pin'] = hash_pin(user_data.pin)
+        update_data['hashed_pin'] = await pin_hasher.run(hash_pin, user_data.pin)
+        update_data['pin_fingerprint'] = fingerprint
     
     if update_data:
-        await db.users.update_one({"id": target_user_id}, {"$set": update_data})
+        update = {"$set": update_data}
+        if update_data.keys() & {"role", "active", "hashed_pin"}:
+            # Revokes the user's existing tokens on every worker
+            update["$inc"] = {"auth_version": 1}
+        await db.users.update_one({"id": target_user_id}, update)
+        invalidate_principal(target_user_id)
     
     # Return updated user
     updated_user = await db.users.find_one({"id": target_user_id})
     return User(**{k: v for k, v in updated_user.items() if k not in ['hashed_pin', 'password']})
 
 @api_router.delete("/auth/users/{target_user_id}")
-async def delete_user(target_user_id: str, user_id: str = Depends(verify_token)):
+async def delete_user(target_user_id: str, principal: Principal = Depends(current_principal)):
     # Only managers can delete users
-    current_user = await db.users.find_one({"id": user_id})
-    if not current_user or current_user.get('role') != 'manager':
+    if principal.role != 'manager':
         raise HTTPException(status_code=403, detail="Access denied. Manager role required.")
     
     # Cannot delete yourself
-    if target_user_id == user_id:
+    if target_user_id == principal.id:
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
     
     # Find target user
@@ -777,19 +2370,33 @@ async def delete_user(target_user_id: str, user_id: str = Depends(verify_token))
     
     # Delete user
     await db.users.delete_one({"id": target_user_id})
+    invalidate_principal(target_user_id)
     return {"message": "User deleted successfully"}
 
+# System metrics
+@api_router.get("/system/metrics")
+async def get_system_metrics(principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
+        raise HTTPException(status_code=403, detail="Manager access required")
+    
+    return {
+        "pin_hasher": pin_hasher.stats(),
+        "live_events": live_events.stats(),
+        "single_flight": single_flight.stats()
+    }
+
 # Modifier Groups routes
 @api_router.post("/modifiers/groups", response_model=ModifierGroup)
 async def create_modifier_group(group: ModifierGroupCreate, user_id: str = Depends(verify_token)):
     group_obj = ModifierGroup(**group.dict())
     await db.modifier_groups.insert_one(group_obj.dict())
+    await menu_catalog.reload()
     return group_obj
 
 @api_router.get("/modifiers/groups", response_model=List[ModifierGroup])
 async def get_modifier_groups():
-    groups = await db.modifier_groups.find().to_list(1000)
-    return [ModifierGroup(**group) for group in groups]
+    catalog = await menu_catalog.get()
+    return catalog.modifier_groups
 
 @api_router.delete("/modifiers/groups/{group_id}")
 async def delete_modifier_group(group_id: str, user_id: str = Depends(verify_token)):
@@ -798,6 +2405,7 @@ async def delete_modifier_group(group_id: str, user_id: str = Depends(verify_tok
     result = await db.modifier_groups.delete_one({"id": group_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Modifier group not found")
+    await menu_catalog.reload()
     return {"message": "Modifier group deleted successfully"}
 
 # Modifiers routes
@@ -805,23 +2413,25 @@ async def delete_modifier_group(group_id: str, user_id: str = Depends(verify_tok
 async def create_modifier(modifier: ModifierCreate, user_id: str = Depends(verify_token)):
     modifier_obj = Modifier(**modifier.dict())
     await db.modifiers.insert_one(modifier_obj.dict())
+    await menu_catalog.reload()
     return modifier_obj
 
 @api_router.get("/modifiers", response_model=List[Modifier])
 async def get_modifiers():
-    modifiers = await db.modifiers.find().to_list(1000)
-    return [Modifier(**modifier) for modifier in modifiers]
+    catalog = await menu_catalog.get()
+    return catalog.modifiers
 
 @api_router.get("/modifiers/group/{group_id}", response_model=List[Modifier])
 async def get_modifiers_by_group(group_id: str):
-    modifiers = await db.modifiers.find({"group_id": group_id}).to_list(1000)
-    return [Modifier(**modifier) for modifier in modifiers]
+    catalog = await menu_catalog.get()
+    return catalog.modifiers_by_group.get(group_id, [])
 
 @api_router.delete("/modifiers/{modifier_id}")
 async def delete_modifier(modifier_id: str, user_id: str = Depends(verify_token)):
     result = await db.modifiers.delete_one({"id": modifier_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Modifier not found")
+    await menu_catalog.reload()
     return {"message": "Modifier deleted successfully"}
 
 # Menu routes
@@ -829,17 +2439,22 @@ async def delete_modifier(modifier_id: str, user_id: str = Depends(verify_token)
 async def create_menu_item(item: MenuItemCreate, user_id: str = Depends(verify_token)):
     item_obj = MenuItem(**item.dict())
     await db.menu_items.insert_one(item_obj.dict())
+    await menu_catalog.reload()
     return item_obj
 
 @api_router.get("/menu/items", response_model=List[MenuItem])
 async def get_menu_items():
-    items = await db.menu_items.find({"available": True}).to_list(1000)
-    return [MenuItem(**item) for item in items]
+    catalog = await menu_catalog.get()
+    
+    async def render_available_items() -> bytes:
+        return render_json([item.dict() for item in catalog.available_items])
+    
+    return json_body_response(await single_flight.do(("menu/items", catalog.version), render_available_items))
 
 @api_router.get("/menu/items/all", response_model=List[MenuItem])
 async def get_all_menu_items(user_id: str = Depends(verify_token)):
-    items = await db.menu_items.find().to_list(1000)
-    return [MenuItem(**item) for item in items]
+    catalog = await menu_catalog.get()
+    return catalog.items
 
 @api_router.put("/menu/items/{item_id}", response_model=MenuItem)
 async def update_menu_item(item_id: str, item: MenuItemCreate, user_id: str = Depends(verify_token)):
@@ -849,6 +2464,7 @@ async def update_menu_item(item_id: str, item: MenuItemCreate, user_id: str = De
     
     updated_item = MenuItem(id=item_id, **item.dict())
     await db.menu_items.replace_one({"id": item_id}, updated_item.dict())
+    await menu_catalog.reload()
     return updated_item
 
 @api_router.delete("/menu/items/{item_id}")
@@ -856,12 +2472,63 @@ async def delete_menu_item(item_id: str, user_id: str = Depends(verify_token)):
     result = await db.menu_items.delete_one({"id": item_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Menu item not found")
+    await menu_catalog.reload()
     return {"message": "Menu item deleted successfully"}
 
 @api_router.get("/menu/categories")
 async def get_menu_categories():
-    categories = await db.menu_items.distinct("category")
-    return {"categories": categories}
+    catalog = await menu_catalog.get()
+    return {"categories": catalog.categories}
+
+@api_router.get("/menu/snapshot")
+async def get_menu_snapshot(request: Request):
+    """Items, categories, modifier groups and modifiers in one payload, revalidated by ETag"""
+    catalog = await menu_catalog.get()
+    headers = {"Cache-Control": "no-cache", "X-Menu-Version": str(catalog.version)}
+    if etag_matches(request, catalog.etag):
+        return Response(status_code=304, headers={**headers, "ETag": catalog.etag})
+    return cached_body_response(request, catalog.snapshot_body, catalog.etag, headers)
+
+# Live event stream
+@api_router.get("/events")
+@uncompressed
+async def stream_events(request: Request, topics: str = "orders,tables,config", token: Optional[str] = None):
+    """Server-Sent Events for order, table and config (tax/charge settings) changes.
+    
+    EventSource cannot set headers, so the access token may be passed as ?token=.
+    Events carry ids and statuses only; clients refetch (e.g. /orders/active?since=) on receipt.
+    """
+    auth_header = request.headers.get("Authorization", "")
+    token = token or (auth_header[7:] if auth_header.startswith("Bearer ") else None)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    principal = await resolve_principal(token)
+    
+    requested = [topic for topic in topics.split(",") if topic]
+    if not requested or any(topic not in LIVE_EVENT_TOPICS for topic in requested):
+        raise HTTPException(status_code=400, detail=f"Topics must be among: {', '.join(LIVE_EVENT_TOPICS)}")
+    
+    queue = live_events.subscribe(requested)
+    
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=LIVE_EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                # Employees only hear about their own orders (resync notices carry no order)
+                if (principal.role != "manager" and event["topic"] == "orders"
+                        and event["type"] != "resync" and event.get("created_by") != principal.id):
+                    continue
+                yield f"event: {event['topic']}\ndata: {render_json(event).decode('utf-8')}\n\n"
+        finally:
+            live_events.unsubscribe(queue)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # Table routes
 @api_router.post("/tables", response_model=Table)
@@ -873,15 +2540,26 @@ async def create_table(table: TableCreate, user_id: str = Depends(verify_token))
     
     table_obj = Table(**table.dict())
     await db.tables.insert_one(table_obj.dict())
+    emit_table_event("table.created", table_obj.id, status=table_obj.status)
     return table_obj
 
-@api_router.get("/tables", response_model=List[Table])
-async def get_tables():
-    tables_data = await db.tables.find().to_list(1000)
-    tables = [Table.from_db_data(table) for table in tables_data]
+async def render_tables() -> tuple[bytes, str]:
+    tables_data = await db.tables.find({}, TABLE_SHAPE.projection).to_list(1000)
+    tables = TABLE_SHAPE.shape_all(tables_data)
     # Sort by name after migration
-    tables.sort(key=lambda t: t.name)
-    return tables
+    tables.sort(key=lambda t: t["name"])
+    
+    # Table statuses change constantly, so the content hash is the version
+    body = render_json(tables)
+    return body, f'"tables-{hashlib.sha1(body).hexdigest()}"'
+
+@api_router.get("/tables", response_model=List[Table])
+async def get_tables(request: Request):
+    body, etag = await single_flight.do(("tables",), render_tables)
+    headers = {"Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+    return cached_body_response(request, body, etag, headers)
 
 @api_router.put("/tables/{table_id}", response_model=Table)
 async def update_table(table_id: str, table_update: TableUpdate, user_id: str = Depends(verify_token)):
@@ -900,6 +2578,7 @@ async def update_table(table_id: str, table_update: TableUpdate, user_id: str =
         update_data['current_order_id'] = table_update.current_order_id
     
     await db.tables.update_one({"id": table_id}, {"$set": update_data})
+    emit_table_event("table.updated", table_id, status=update_data["status"])
     
     updated_table = await db.tables.find_one({"id": table_id})
     return Table(**updated_table)
@@ -948,12 +2627,14 @@ async def merge_table_orders(table_id: str, merge_request: TableMoveRequest, use
                 "tax": total_tax,
                 "tip": total_tip,
                 "total": total_amount,
+                "pricing_breakdown": None,
                 "updated_at": get_current_time()
             }
         }
     )
     
     # Delete source order
+    await record_order_tombstone(source_order)
     await db.orders.delete_one({"id": source_order_id})
     
     # Clear source table
@@ -962,6 +2643,10 @@ async def merge_table_orders(table_id: str, merge_request: TableMoveRequest, use
         {"$set": {"status": "available", "current_order_id": None}}
     )
     
+    emit_order_event("order.updated", dest_order)
+    emit_order_event("order.deleted", source_order, merged_into=dest_order_id)
+    emit_table_event("table.updated", table_id, status="available")
+    
     return {"message": "Orders merged successfully"}
 
 @api_router.post("/tables/{table_id}/move")
@@ -999,10 +2684,16 @@ async def move_table_order(table_id: str, move_request: TableMoveRequest, user_i
         {"$set": {"status": "occupied", "current_order_id": order_id}}
     )
     
+    order = await db.orders.find_one({"id": order_id}, {"_id": 0, "id": 1, "created_by": 1, "table_id": 1})
+    if order:
+        emit_order_event("order.moved", order, previous_table_id=table_id)
+    emit_table_event("table.updated", table_id, status="available")
+    emit_table_event("table.updated", move_request.new_table_id, status="occupied", current_order_id=order_id)
+    
     return {"message": "Order moved successfully"}
 
 @api_router.delete("/tables/{table_id}")
-async def delete_table(table_id: str, user_id: str = Depends(verify_token)):
+async def delete_table(table_id: str, principal: Principal = Depends(current_principal)):
     # First, find the table to check if it exists and if it's occupied
     table = await db.tables.find_one({"id": table_id})
     if not table:
@@ -1016,14 +2707,11 @@ async def delete_table(table_id: str, user_id: str = Depends(verify_token)):
         order = await db.orders.find_one({"id": order_id})
         
         if order and order.get("status") not in ["paid", "delivered", "cancelled"]:
-            # Get user info for tracking
-            user = await db.users.find_one({"id": user_id})
-            
             # Cancel the associated order first
             cancellation_info = {
                 "reason": "table_deleted",
                 "notes": f"Order automatically cancelled due to table '{table.get('name', table_id)}' deletion",
-                "cancelled_by": user.get("full_name", "Unknown") if user else "Unknown",
+                "cancelled_by": principal.full_name,
                 "cancelled_at": get_current_time()
             }
             
@@ -1036,30 +2724,44 @@ async def delete_table(table_id: str, user_id: str = Depends(verify_token)):
                     "cancellation_info": cancellation_info
                 }}
             )
+            emit_order_event("order.cancelled", order, status="cancelled")
     
     # Now delete the table
     result = await db.tables.delete_one({"id": table_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Table not found")
+    emit_table_event("table.deleted", table_id)
     
     return {"message": "Table deleted successfully", "cancelled_order": bool(table.get("current_order_id"))}
 
 # Customer routes
 @api_router.post("/customers", response_model=Customer)
 async def create_customer(customer: CustomerCreate, user_id: str = Depends(verify_token)):
-    # Check if customer with phone already exists
-    existing_customer = await db.customers.find_one({"phone": customer.phone})
-    if existing_customer:
-        return Customer(**existing_customer)
-    
-    customer_obj = Customer(**customer.dict())
-    await db.customers.insert_one(customer_obj.dict())
-    return customer_obj
+    # An existing customer with the same (normalized) phone is returned unchanged
+    return Customer(**await upsert_customer(customer.phone, {}, defaults=customer.dict()))
 
 @api_router.get("/customers", response_model=List[Customer])
 async def get_customers(user_id: str = Depends(verify_token)):
-    customers = await db.customers.find().sort("created_at", -1).to_list(1000)
-    return [Customer(**customer) for customer in customers]
+    customers = await db.customers.find({}, CUSTOMER_SHAPE.projection).sort("created_at", -1).to_list(1000)
+    return CustomJSONResponse(CUSTOMER_SHAPE.shape_all(customers))
+
+@api_router.get("/customers/search", response_model=List[Customer])
+async def search_customers(q: str = "", limit: Optional[int] = None, user_id: str = Depends(verify_token)):
+    """Typeahead: customers whose phone starts with, or whose name/address words start with, q.
+    An empty query returns the most recently updated customers."""
+    limit = min(max(1, limit or CUSTOMER_SEARCH_LIMIT), CUSTOMER_SEARCH_LIMIT_MAX)
+    query = customer_search_query(q)
+    if query is None and q.strip():
+        # Typed something, but nothing searchable in it
+        return CustomJSONResponse([])
+    if query is None:
+        customers = await db.customers.find({}, CUSTOMER_SHAPE.projection).sort("updated_at", -1).to_list(limit)
+    else:
+        # Regulars first among the matches
+        customers = await db.customers.find(query, CUSTOMER_SHAPE.projection).sort(
+            [("total_orders", DESCENDING), ("name", ASCENDING)]
+        ).limit(limit).to_list(limit)
+    return CustomJSONResponse(CUSTOMER_SHAPE.shape_all(customers))
 
 @api_router.get("/customers/{customer_id}")
 async def get_customer_by_id(customer_id: str, user_id: str = Depends(verify_token)):
@@ -1070,11 +2772,29 @@ async def get_customer_by_id(customer_id: str, user_id: str = Depends(verify_tok
 
 @api_router.get("/customers/phone/{phone}")
 async def get_customer_by_phone(phone: str, user_id: str = Depends(verify_token)):
-    customer = await db.customers.find_one({"phone": phone})
+    customer = await db.customers.find_one({"phone_normalized": normalize_phone(phone)})
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     return Customer(**customer)
 
+@api_router.get("/customers/caller/{phone}", response_model=CallerLookup)
+async def get_caller(phone: str, orders: Optional[int] = None, user_id: str = Depends(verify_token)):
+    """Caller ID for phone orders: profile, running stats and the latest orders for a number"""
+    customer = await db.customers.find_one({"phone_normalized": normalize_phone(phone)}, CUSTOMER_SHAPE.projection)
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    # Stats are kept on the customer document, so only the order history needs another query
+    page = await fetch_order_page({"customer_id": customer["id"], "status": {"$ne": "draft"}},
+                                  orders or CALLER_RECENT_ORDERS, None, ORDER_HISTORY_PROJECTION, OrderHistoryRow)
+    return {
+        "customer": CUSTOMER_SHAPE.shape(customer),
+        "stats": customer_stats_summary(customer.get("total_orders", 0), customer.get("total_spent", 0.0),
+                                        customer.get("last_order_date")),
+        "recent_orders": page["orders"],
+        "next_cursor": page["next_cursor"]
+    }
+
 @api_router.put("/customers/{customer_id}", response_model=Customer)
 async def update_customer(customer_id: str, customer_update: CustomerUpdate, user_id: str = Depends(verify_token)):
     existing_customer = await db.customers.find_one({"id": customer_id})
@@ -1083,9 +2803,18 @@ async def update_customer(customer_id: str, customer_update: CustomerUpdate, use
     
     # Update only provided fields
     update_data = {k: v for k, v in customer_update.dict().items() if v is not None}
+    if "phone" in update_data:
+        update_data["phone_normalized"] = normalize_phone(update_data["phone"])
+        if not update_data["phone_normalized"]:
+            raise HTTPException(status_code=400, detail="Invalid phone number")
+    if "name" in update_data or "address" in update_data:
+        update_data["search_tokens"] = customer_search_tokens({**existing_customer, **update_data})
     update_data["updated_at"] = get_current_time()
     
-    await db.customers.update_one({"id": customer_id}, {"$set": update_data})
+    try:
+        await db.customers.update_one({"id": customer_id}, {"$set": update_data})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Another customer already has this phone number")
     
     updated_customer = await db.customers.find_one({"id": customer_id})
     return Customer(**updated_customer)
@@ -1097,151 +2826,71 @@ async def delete_customer(customer_id: str, user_id: str = Depends(verify_token)
         raise HTTPException(status_code=404, detail="Customer not found")
     return {"message": "Customer deleted successfully"}
 
-@api_router.get("/customers/{customer_id}/orders", response_model=List[Order])
-async def get_customer_orders(customer_id: str, user_id: str = Depends(verify_token)):
-    # Get customer to verify they exist
-    customer = await db.customers.find_one({"id": customer_id})
-    if not customer:
+@api_router.get("/customers/{customer_id}/orders", response_model=OrderHistoryPage)
+async def get_customer_orders(customer_id: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                              user_id: str = Depends(verify_token)):
+    """A customer's orders, newest first, one page at a time"""
+    if not await db.customers.find_one({"id": customer_id}, {"_id": 1}):
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    # Get all orders for this customer
-    orders = await db.orders.find({
-        "$or": [
-            {"customer_id": customer_id},
-            {"customer_phone": customer["phone"]}
-        ],
-        "status": {"$ne": "draft"}
-    }).sort("created_at", -1).to_list(1000)
+    query = {"customer_id": customer_id, "status": {"$ne": "draft"}}
+    return await fetch_order_page(query, limit, cursor, ORDER_HISTORY_PROJECTION, OrderHistoryRow)
+
+@api_router.post("/customers/stats/reconcile")
+async def reconcile_customer_stats_now(principal: Principal = Depends(current_principal)):
+    """Rebuild all customers' order counts and spend from paid orders"""
+    if principal.role != "manager":
+        raise HTTPException(status_code=403, detail="Manager access required")
     
-    return [Order(**order) for order in orders]
+    return await reconcile_customer_stats()
 
 @api_router.get("/customers/{customer_id}/stats")
 async def get_customer_stats(customer_id: str, user_id: str = Depends(verify_token)):
     # Get customer to verify they exist
-    customer = await db.customers.find_one({"id": customer_id})
-    if not customer:
+    if not await db.customers.find_one({"id": customer_id}, {"_id": 1}):
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    # Get all paid orders for this customer
-    orders = await db.orders.find({
-        "$or": [
-            {"customer_id": customer_id},
-            {"customer_phone": customer["phone"]}
-        ],
-        "status": "paid"
-    }).to_list(1000)
-    
-    total_orders = len(orders)
-    total_spent = sum(order.get("total", 0) for order in orders)
-    
-    # Find last order date
-    last_order_date = None
-    if orders:
-        last_order = max(orders, key=lambda o: o.get("created_at", datetime.min))
-        last_order_date = last_order.get("created_at")
-    
-    # Calculate days since last order
-    days_since_last_order = None
-    if last_order_date:
-        if isinstance(last_order_date, str):
-            last_order_date = datetime.fromisoformat(last_order_date.replace('Z', '+00:00'))
-        elif isinstance(last_order_date, datetime) and last_order_date.tzinfo is None:
-            last_order_date = last_order_date.replace(tzinfo=pytz.UTC)
-        
-        current_time = get_current_time()
-        days_since_last_order = (current_time - last_order_date).days
-    
-    return {
-        "total_orders": total_orders,
-        "total_spent": total_spent,
-        "last_order_date": last_order_date,
-        "days_since_last_order": days_since_last_order,
-        "average_order_value": total_spent / total_orders if total_orders > 0 else 0
-    }
+    groups = await db.orders.aggregate([
+        {"$match": {"customer_id": customer_id, "status": "paid"}},
+        {"$group": {
+            "_id": None,
+            "total_orders": {"$sum": 1},
+            "total_spent": {"$sum": "$total"},
+            "last_order_date": {"$max": {"$ifNull": ["$paid_at", "$created_at"]}}
+        }}
+    ]).to_list(1)
+    stats = groups[0] if groups else {"total_orders": 0, "total_spent": 0, "last_order_date": None}
+    return customer_stats_summary(stats["total_orders"], stats["total_spent"], stats["last_order_date"])
 
 # Order routes
 @api_router.post("/orders", response_model=Order)
 async def create_order(order_data: OrderCreate, user_id: str = Depends(verify_token)):
     # Process order items and calculate totals
-    processed_items = []
-    subtotal = 0
-    
-    for item_data in order_data.items:
-        menu_item = await db.menu_items.find_one({"id": item_data["menu_item_id"]})
-        if not menu_item:
-            raise HTTPException(status_code=404, detail=f"Menu item not found: {item_data['menu_item_id']}")
-        
-        # Process modifiers
-        modifiers = []
-        modifier_total = 0
-        
-        for modifier_data in item_data.get("modifiers", []):
-            modifier = await db.modifiers.find_one({"id": modifier_data["modifier_id"]})
-            if modifier:
-                modifiers.append(OrderItemModifier(
-                    modifier_id=modifier["id"],
-                    name=modifier["name"],
-                    price=modifier["price"]
-                ))
-                modifier_total += modifier["price"]
-        
-        item_total = (menu_item["price"] + modifier_total) * item_data["quantity"]
-        
-        order_item = OrderItem(
-            menu_item_id=menu_item["id"],
-            menu_item_name=menu_item["name"],
-            quantity=item_data["quantity"],
-            base_price=menu_item["price"],
-            modifiers=modifiers,
-            special_instructions=item_data.get("special_instructions", ""),
-            total_price=item_total
-        )
-        
-        processed_items.append(order_item)
-        subtotal += item_total
+    processed_items, subtotal = await build_order_items(order_data.items)
     
     # Calculate dynamic taxes, service charges, gratuity, and discounts
-    tax, service_charges_total, gratuity_total, discounts_total = await calculate_order_taxes_and_charges(
+    pricing = await calculate_order_pricing(
         subtotal, 
         order_data.order_type, 
         order_data.party_size,
         order_data.applied_discount_ids
     )
+    tax, service_charges_total, gratuity_total, discounts_total = (
+        pricing["tax"], pricing["service_charges"], pricing["gratuity"], pricing["discounts"]
+    )
     total = subtotal + tax + service_charges_total + gratuity_total - discounts_total + order_data.tip
     
     # Generate order number
-    order_count = await db.orders.count_documents({})
-    order_number = f"ORD-{order_count + 1:04d}"
+    order_number = await order_numbers.next_number()
     
     # Create or update customer if provided
     customer_id = None
     if order_data.customer_phone:
-        # Check if customer exists
-        existing_customer = await db.customers.find_one({"phone": order_data.customer_phone})
-        
-        if existing_customer:
-            # Update existing customer info if new data is provided
-            update_data = {}
-            if order_data.customer_name and order_data.customer_name != existing_customer.get("name", ""):
-                update_data["name"] = order_data.customer_name
-            if order_data.customer_address and order_data.customer_address != existing_customer.get("address", ""):
-                update_data["address"] = order_data.customer_address
-            
-            if update_data:
-                update_data["updated_at"] = get_current_time()
-                await db.customers.update_one({"id": existing_customer["id"]}, {"$set": update_data})
-            
-            customer_id = existing_customer["id"]
-        else:
-            # Create new customer
-            customer_data = CustomerCreate(
-                name=order_data.customer_name,
-                phone=order_data.customer_phone,
-                address=order_data.customer_address
-            )
-            new_customer = Customer(**customer_data.dict())
-            await db.customers.insert_one(new_customer.dict())
-            customer_id = new_customer.id
+        customer = await upsert_customer(order_data.customer_phone, {
+            "name": order_data.customer_name,
+            "address": order_data.customer_address
+        })
+        customer_id = customer["id"]
     
     # Get table info if dine-in
     table_name = None
@@ -1266,6 +2915,7 @@ async def create_order(order_data: OrderCreate, user_id: str = Depends(verify_to
         gratuity=gratuity_total,
         discounts=discounts_total,
         applied_discount_ids=order_data.applied_discount_ids,
+        pricing_breakdown=pricing["breakdown"],
         tip=order_data.tip,
         total=total,
         order_type=order_data.order_type,
@@ -1276,6 +2926,7 @@ async def create_order(order_data: OrderCreate, user_id: str = Depends(verify_to
     )
     
     await db.orders.insert_one(order_obj.dict())
+    emit_order_event("order.created", order_obj.dict(), status=order_obj.status)
     return order_obj
 
 @api_router.post("/orders/{order_id}/send")
@@ -1299,6 +2950,8 @@ async def send_order_to_kitchen(order_id: str, user_id: str = Depends(verify_tok
             {"id": order["table_id"]},
             {"$set": {"status": "occupied", "current_order_id": order_id}}
         )
+        emit_table_event("table.updated", order["table_id"], status="occupied", current_order_id=order_id)
+    emit_order_event("order.sent", order, status="pending")
     
     return {"message": "Order sent to kitchen successfully"}
 
@@ -1308,11 +2961,12 @@ async def process_payment(order_id: str, payment: PaymentRequest, user_id: str =
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
+    now = get_current_time()
     update_data = {
         "payment_method": payment.payment_method,
         "payment_status": "completed",
         "status": "paid",
-        "updated_at": get_current_time()
+        "updated_at": now
     }
     
     # Handle cash payment
@@ -1324,39 +2978,16 @@ async def process_payment(order_id: str, payment: PaymentRequest, user_id: str =
         update_data["cash_received"] = payment.cash_received
         update_data["change_amount"] = change_amount
     
-    await db.orders.update_one({"id": order_id}, {"$set": update_data})
+    # Atomically read the prior status so a repeated payment isn't counted twice;
+    # a repeated payment keeps the first payment time
+    update_data["paid_at"] = {"$ifNull": ["$paid_at", now]}
+    previous = await db.orders.find_one_and_update(
+        {"id": order_id}, [{"$set": update_data}], return_document=ReturnDocument.BEFORE
+    )
     
     # Update customer statistics if customer exists
-    if order.get("customer_id") or order.get("customer_phone"):
-        customer = None
-        if order.get("customer_id"):
-            customer = await db.customers.find_one({"id": order["customer_id"]})
-        elif order.get("customer_phone"):
-            customer = await db.customers.find_one({"phone": order["customer_phone"]})
-        
-        if customer:
-            # Calculate new statistics
-            customer_orders = await db.orders.find({
-                "$or": [
-                    {"customer_id": customer["id"]},
-                    {"customer_phone": customer["phone"]}
-                ],
-                "status": "paid"
-            }).to_list(1000)
-            
-            total_orders = len(customer_orders)
-            total_spent = sum(order_item.get("total", 0) for order_item in customer_orders)
-            
-            # Update customer record
-            await db.customers.update_one(
-                {"id": customer["id"]},
-                {"$set": {
-                    "total_orders": total_orders,
-                    "total_spent": total_spent,
-                    "last_order_date": get_current_time(),
-                    "updated_at": get_current_time()
-                }}
-            )
+    if previous and previous.get("status") != "paid":
+        await record_customer_payment(order, previous.get("paid_at") or now)
     
     # Free table if it's a table order
     if order.get("table_id"):
@@ -1364,6 +2995,8 @@ async def process_payment(order_id: str, payment: PaymentRequest, user_id: str =
             {"id": order["table_id"]},
             {"$set": {"status": "available", "current_order_id": None}}
         )
+        emit_table_event("table.updated", order["table_id"], status="available")
+    emit_order_event("order.paid", order, status="paid")
     
     updated_order = await db.orders.find_one({"id": order_id})
     return {
@@ -1377,7 +3010,7 @@ class OrderCancellation(BaseModel):
     notes: str = ""  # Additional details, especially for "other"
 
 @api_router.post("/orders/{order_id}/cancel")
-async def cancel_order(order_id: str, cancellation: OrderCancellation, user_id: str = Depends(verify_token)):
+async def cancel_order(order_id: str, cancellation: OrderCancellation, principal: Principal = Depends(current_principal)):
     order = await db.orders.find_one({"id": order_id})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -1386,14 +3019,11 @@ async def cancel_order(order_id: str, cancellation: OrderCancellation, user_id:
     if order.get("status") in ["paid", "delivered", "cancelled"]:
         raise HTTPException(status_code=400, detail="Cannot cancel paid, delivered, or already cancelled orders")
     
-    # Get user info for tracking
-    user = await db.users.find_one({"id": user_id})
-    
     # Update order status to cancelled with cancellation details
     cancellation_info = {
         "reason": cancellation.reason,
         "notes": cancellation.notes,
-        "cancelled_by": user.get("full_name", "Unknown") if user else "Unknown",
+        "cancelled_by": principal.full_name,
         "cancelled_at": get_current_time()
     }
     
@@ -1412,11 +3042,13 @@ async def cancel_order(order_id: str, cancellation: OrderCancellation, user_id:
             {"id": order["table_id"]},
             {"$set": {"status": "available", "current_order_id": None}}
         )
+        emit_table_event("table.updated", order["table_id"], status="available")
+    emit_order_event("order.cancelled", order, status="cancelled")
     
     return {"message": "Order cancelled successfully", "cancellation_info": cancellation_info}
 
 @api_router.delete("/orders/{order_id}/items/{item_index}")
-async def remove_order_item(order_id: str, item_index: int, removal: ItemRemovalRequest, user_id: str = Depends(verify_token)):
+async def remove_order_item(order_id: str, item_index: int, removal: ItemRemovalRequest, principal: Principal = Depends(current_principal)):
     order = await db.orders.find_one({"id": order_id})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -1424,15 +3056,12 @@ async def remove_order_item(order_id: str, item_index: int, removal: ItemRemoval
     if item_index >= len(order["items"]):
         raise HTTPException(status_code=404, detail="Item not found")
     
-    # Get user info for tracking
-    user = await db.users.find_one({"id": user_id})
-    
     # Store removed item info
     removed_item = order["items"][item_index].copy()
     removed_item["removal_info"] = {
         "reason": removal.reason,
         "notes": removal.notes,
-        "removed_by": user.get("full_name", "Unknown") if user else "Unknown",
+        "removed_by": principal.full_name,
         "removed_at": datetime.utcnow()
     }
     
@@ -1458,129 +3087,123 @@ async def remove_order_item(order_id: str, item_index: int, removal: ItemRemoval
                 "subtotal": subtotal,
                 "tax": tax,
                 "total": total,
+                "pricing_breakdown": None,
                 "updated_at": get_current_time()
             }
         }
     )
+    emit_order_event("order.updated", order)
     
     return {"message": "Item removed successfully"}
 
-@api_router.get("/orders", response_model=List[Order])
-async def get_orders(user_id: str = Depends(verify_token)):
-    # Get current user to check role
-    user = await db.users.find_one({"id": user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+@api_router.get("/orders", response_model=Union[List[Order], OrderPage])
+async def get_orders(limit: Optional[int] = None, cursor: Optional[str] = None,
+                     principal: Principal = Depends(current_principal)):
     # Managers see all orders, employees see only their orders
-    if user.get("role") == "manager":
-        orders = await db.orders.find({"status": {"$ne": "draft"}}).sort("created_at", -1).to_list(1000)
+    if principal.role == "manager":
+        query = {"status": {"$ne": "draft"}}
     else:
-        orders = await db.orders.find({"created_by": user_id, "status": {"$ne": "draft"}}).sort("created_at", -1).to_list(1000)
+        query = {"created_by": principal.id, "status": {"$ne": "draft"}}
     
-    return [Order(**order) for order in orders]
-
-@api_router.get("/orders/active", response_model=List[Order])
-async def get_active_orders(user_id: str = Depends(verify_token)):
-    # Get current user to check role  
-    user = await db.users.find_one({"id": user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Active orders include pending (pay later) and processing statuses
-    active_statuses = ["pending", "confirmed", "preparing", "ready", "out_for_delivery"]
+    # Paginated summary rows when asked for; otherwise the legacy full list
+    if limit is not None or cursor is not None:
+        return await fetch_order_page(query, limit, cursor)
     
-    if user.get("role") == "manager":
-        orders = await db.orders.find({"status": {"$in": active_statuses}}).sort("created_at", -1).to_list(1000)
+    key = ("orders", query.get("created_by", "all"))
+    return json_body_response(await single_flight.do(key, lambda: render_order_list(query)))
+
+@api_router.get("/orders/active", response_model=Union[List[Order], ActiveOrdersDelta, OrderPage])
+async def get_active_orders(limit: Optional[int] = None, cursor: Optional[str] = None,
+                            since: Optional[str] = None, principal: Principal = Depends(current_principal)):
+    if principal.role == "manager":
+        query = {"status": {"$in": ACTIVE_ORDER_STATUSES}}
     else:
-        orders = await db.orders.find({
-            "created_by": user_id,
-            "status": {"$in": active_statuses}
-        }).sort("created_at", -1).to_list(1000)
-    
-    return [Order(**order) for order in orders]
+        query = {"created_by": principal.id, "status": {"$in": ACTIVE_ORDER_STATUSES}}
+    
+    # Delta sync: ?since= (empty for the initial full list) then the returned cursor on each poll
+    if since is not None:
+        scope = {k: v for k, v in query.items() if k != "status"}
+        if since:
+            return CustomJSONResponse(await fetch_active_orders_delta(scope, since))
+        # Terminals starting up together share the initial full sync
+        key = ("orders/active:sync", query.get("created_by", "all"))
+        return json_body_response(await single_flight.do(key, lambda: render_active_orders_sync(scope)))
+    
+    if limit is not None or cursor is not None:
+        return await fetch_order_page(query, limit, cursor)
+    
+    key = ("orders/active", query.get("created_by", "all"))
+    return json_body_response(await single_flight.do(key, lambda: render_order_list(query)))
+
+@api_router.get("/orders/history", response_model=OrderHistoryPage)
+async def get_order_history(date_filter: Optional[str] = None, start_date: Optional[str] = None,
+                            end_date: Optional[str] = None, status: Optional[OrderStatus] = None,
+                            limit: Optional[int] = None, cursor: Optional[str] = None,
+                            principal: Principal = Depends(current_principal)):
+    """Order history for today/week/month/custom (start_date/end_date) ranges, one page at a time"""
+    query = {"status": status.value if status else {"$ne": "draft"}}
+    # Managers see all orders, employees see only their orders
+    if principal.role != "manager":
+        query["created_by"] = principal.id
+    
+    start, end = history_date_range(date_filter, start_date, end_date)
+    if start or end:
+        query["created_at"] = {}
+        if start:
+            query["created_at"]["$gte"] = start
+        if end:
+            query["created_at"]["$lt"] = end
+    
+    page = await fetch_order_page(query, limit, cursor, ORDER_HISTORY_PROJECTION, OrderHistoryRow)
+    if cursor is None:
+        page["total_count"] = await db.orders.count_documents(query)
+    return page
 
 @api_router.get("/orders/{order_id}", response_model=Order)
-async def get_order(order_id: str, user_id: str = Depends(verify_token)):
+async def get_order(order_id: str, principal: Principal = Depends(current_principal)):
     order = await db.orders.find_one({"id": order_id})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     # Check if user can access this order
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager" and order["created_by"] != user_id:
+    if principal.role != "manager" and order["created_by"] != principal.id:
         raise HTTPException(status_code=403, detail="Access denied")
     
     return Order(**order)
 
 @api_router.put("/orders/{order_id}")
-async def update_order(order_id: str, order_data: OrderCreate, user_id: str = Depends(verify_token)):
+async def update_order(order_id: str, order_data: OrderCreate, principal: Principal = Depends(current_principal)):
     existing_order = await db.orders.find_one({"id": order_id})
     if not existing_order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     # Check if user can update this order
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager" and existing_order["created_by"] != user_id:
+    if principal.role != "manager" and existing_order["created_by"] != principal.id:
         raise HTTPException(status_code=403, detail="Access denied")
     
     # Process order items and calculate totals
-    processed_items = []
-    subtotal = 0
-    
-    for item_data in order_data.items:
-        menu_item = await db.menu_items.find_one({"id": item_data["menu_item_id"]})
-        if not menu_item:
-            raise HTTPException(status_code=404, detail=f"Menu item not found: {item_data['menu_item_id']}")
-        
-        # Process modifiers
-        modifiers = []
-        modifier_total = 0
-        
-        for modifier_data in item_data.get("modifiers", []):
-            modifier = await db.modifiers.find_one({"id": modifier_data["modifier_id"]})
-            if modifier:
-                modifiers.append(OrderItemModifier(
-                    modifier_id=modifier["id"],
-                    name=modifier["name"],
-                    price=modifier["price"]
-                ))
-                modifier_total += modifier["price"]
-        
-        item_total = (menu_item["price"] + modifier_total) * item_data["quantity"]
-        
-        order_item = OrderItem(
-            menu_item_id=menu_item["id"],
-            menu_item_name=menu_item["name"],
-            quantity=item_data["quantity"],
-            base_price=menu_item["price"],
-            modifiers=modifiers,
-            special_instructions=item_data.get("special_instructions", ""),
-            total_price=item_total
-        )
-        
-        processed_items.append(order_item)
-        subtotal += item_total
+    processed_items, subtotal = await build_order_items(order_data.items)
     
     # Calculate dynamic taxes, service charges, gratuity, and discounts
-    tax, service_charges_total, gratuity_total, discounts_total = await calculate_order_taxes_and_charges(
+    pricing = await calculate_order_pricing(
         subtotal, 
         order_data.order_type, 
         order_data.party_size,
         order_data.applied_discount_ids
     )
+    tax, service_charges_total, gratuity_total, discounts_total = (
+        pricing["tax"], pricing["service_charges"], pricing["gratuity"], pricing["discounts"]
+    )
     total = subtotal + tax + service_charges_total + gratuity_total - discounts_total + order_data.tip
     
     # Create customer if provided
     customer_id = existing_order.get("customer_id")
     if order_data.customer_phone:
-        customer_data = CustomerCreate(
-            name=order_data.customer_name,
-            phone=order_data.customer_phone,
-            address=order_data.customer_address
-        )
-        customer = await create_customer(customer_data, user_id)
-        customer_id = customer.id
+        customer = await upsert_customer(order_data.customer_phone, {
+            "name": order_data.customer_name,
+            "address": order_data.customer_address
+        })
+        customer_id = customer["id"]
     
     # Get table info if dine-in
     table_name = existing_order.get("table_name")
@@ -1605,6 +3228,7 @@ async def update_order(order_id: str, order_data: OrderCreate, user_id: str = De
         "gratuity": gratuity_total,
         "discounts": discounts_total,
         "applied_discount_ids": order_data.applied_discount_ids,
+        "pricing_breakdown": pricing["breakdown"],
         "tip": order_data.tip,
         "total": total,
         "order_type": order_data.order_type,
@@ -1614,6 +3238,7 @@ async def update_order(order_id: str, order_data: OrderCreate, user_id: str = De
     }
     
     await db.orders.update_one({"id": order_id}, {"$set": update_data})
+    emit_order_event("order.updated", existing_order)
     
     updated_order = await db.orders.find_one({"id": order_id})
     return Order(**updated_order)
@@ -1646,19 +3271,20 @@ async def assign_table_to_order(order_id: str, table_data: dict, user_id: str =
         {"id": table_id}, 
         {"$set": {"status": "occupied", "current_order_id": order_id}}
     )
+    emit_order_event("order.moved", {**order, "table_id": table_id}, previous_table_id=order.get("table_id"))
+    emit_table_event("table.updated", table_id, status="occupied", current_order_id=order_id)
     
     updated_order = await db.orders.find_one({"id": order_id})
     return Order(**updated_order)
 
 @api_router.delete("/orders/{order_id}")
-async def delete_order(order_id: str, user_id: str = Depends(verify_token)):
+async def delete_order(order_id: str, principal: Principal = Depends(current_principal)):
     order = await db.orders.find_one({"id": order_id})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     # Check if user can delete this order
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager" and order["created_by"] != user_id:
+    if principal.role != "manager" and order["created_by"] != principal.id:
         raise HTTPException(status_code=403, detail="Access denied")
     
     # Free table if it's a table order
@@ -1667,15 +3293,20 @@ async def delete_order(order_id: str, user_id: str = Depends(verify_token)):
             {"id": order["table_id"]},
             {"$set": {"status": "available", "current_order_id": None}}
         )
+        emit_table_event("table.updated", order["table_id"], status="available")
     
+    await record_order_tombstone(order)
     result = await db.orders.delete_one({"id": order_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Order not found")
+    if order.get("status") == "paid":
+        await reverse_customer_payment(order)
+    emit_order_event("order.deleted", order)
     
     return {"message": "Order deleted successfully"}
 
 @api_router.put("/orders/{order_id}/status")
-async def update_order_status(order_id: str, status: Dict[str, str], user_id: str = Depends(verify_token)):
+async def update_order_status(order_id: str, status: Dict[str, str], principal: Principal = Depends(current_principal)):
     new_status = status.get("status")
     if new_status not in [s.value for s in OrderStatus]:
         raise HTTPException(status_code=400, detail="Invalid status")
@@ -1685,15 +3316,25 @@ async def update_order_status(order_id: str, status: Dict[str, str], user_id: st
         raise HTTPException(status_code=404, detail="Order not found")
     
     # Check if user can update this order
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager" and order["created_by"] != user_id:
+    if principal.role != "manager" and order["created_by"] != principal.id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    result = await db.orders.update_one(
-        {"id": order_id}, 
-        {"$set": {"status": new_status, "updated_at": get_current_time()}}
+    now = get_current_time()
+    update_data = {"status": new_status, "updated_at": now}
+    if new_status == "paid":
+        # Keeps the first payment time if the order was paid before
+        update_data["paid_at"] = {"$ifNull": ["$paid_at", now]}
+    previous = await db.orders.find_one_and_update(
+        {"id": order_id}, [{"$set": update_data}], return_document=ReturnDocument.BEFORE
     )
     
+    # Keep customer totals in step with orders entering or leaving paid
+    if previous and previous.get("status") == "paid" and new_status != "paid":
+        await reverse_customer_payment(previous)
+    elif previous and previous.get("status") != "paid" and new_status == "paid":
+        await record_customer_payment(previous, previous.get("paid_at") or now)
+    emit_order_event("order.status_changed", order, status=new_status)
+    
     return {"message": "Order status updated successfully"}
 
 # Time tracking routes
@@ -1766,10 +3407,9 @@ async def get_time_entries(user_id: str = Depends(verify_token)):
     return [TimeEntry(**entry) for entry in entries]
 
 @api_router.get("/time/active-employees")
-async def get_active_employees(user_id: str = Depends(verify_token)):
+async def get_active_employees(principal: Principal = Depends(current_principal)):
     # Check if user is manager
-    user = await db.users.find_one({"id": user_id})
-    if not user or user.get("role") != "manager":
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Manager access required")
     
     today = get_current_time().date().isoformat()
@@ -1800,30 +3440,46 @@ async def get_active_employees(user_id: str = Depends(verify_token)):
 
 # Tax & Charges Management Routes
 
+@api_router.get("/tax-charges/version")
+async def get_tax_charges_version(principal: Principal = Depends(current_principal)):
+    """Cheap check for whether cached tax/charge settings are stale"""
+    return {"version": await charge_rules.version()}
+
+@api_router.get("/tax-charges/snapshot")
+async def get_tax_charges_snapshot(request: Request, principal: Principal = Depends(current_principal)):
+    """Tax rates, service charges, gratuity rules and discount policies in one payload.
+    
+    Readable by every signed-in user since order entry prices with it; revalidate with If-None-Match.
+    """
+    version = await charge_rules.version()
+    body, etag = await charge_rules.snapshot(version)
+    headers = {"Cache-Control": "no-cache", "X-Config-Version": str(version)}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+    return cached_body_response(request, body, etag, headers)
+
 # Tax Rates
 @api_router.get("/tax-charges/tax-rates", response_model=List[TaxRate])
-async def get_tax_rates(user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def get_tax_rates(principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
-    tax_rates = await db.tax_rates.find().sort("created_at", -1).to_list(1000)
-    return [TaxRate(**rate) for rate in tax_rates]
+    tax_rates = await db.tax_rates.find({}, TAX_RATE_SHAPE.projection).sort("created_at", -1).to_list(1000)
+    return CustomJSONResponse(TAX_RATE_SHAPE.shape_all(tax_rates))
 
 @api_router.post("/tax-charges/tax-rates", response_model=TaxRate)
-async def create_tax_rate(tax_rate: TaxRateCreate, user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def create_tax_rate(tax_rate: TaxRateCreate, principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
     tax_rate_obj = TaxRate(**tax_rate.dict())
     await db.tax_rates.insert_one(tax_rate_obj.dict())
+    await charge_rules.record_change()
     return tax_rate_obj
 
 @api_router.put("/tax-charges/tax-rates/{tax_rate_id}", response_model=TaxRate)
-async def update_tax_rate(tax_rate_id: str, tax_rate_update: TaxRateCreate, user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def update_tax_rate(tax_rate_id: str, tax_rate_update: TaxRateCreate, principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
     existing_rate = await db.tax_rates.find_one({"id": tax_rate_id})
@@ -1834,45 +3490,44 @@ async def update_tax_rate(tax_rate_id: str, tax_rate_update: TaxRateCreate, user
     update_data["updated_at"] = get_current_time()
     
     await db.tax_rates.update_one({"id": tax_rate_id}, {"$set": update_data})
+    await charge_rules.record_change()
     updated_rate = await db.tax_rates.find_one({"id": tax_rate_id})
     return TaxRate(**updated_rate)
 
 @api_router.delete("/tax-charges/tax-rates/{tax_rate_id}")
-async def delete_tax_rate(tax_rate_id: str, user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def delete_tax_rate(tax_rate_id: str, principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
     result = await db.tax_rates.delete_one({"id": tax_rate_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Tax rate not found")
+    await charge_rules.record_change()
     
     return {"message": "Tax rate deleted successfully"}
 
 # Service Charges
 @api_router.get("/tax-charges/service-charges", response_model=List[ServiceCharge])
-async def get_service_charges(user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def get_service_charges(principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
-    charges = await db.service_charges.find().sort("created_at", -1).to_list(1000)
-    return [ServiceCharge(**charge) for charge in charges]
+    charges = await db.service_charges.find({}, SERVICE_CHARGE_SHAPE.projection).sort("created_at", -1).to_list(1000)
+    return CustomJSONResponse(SERVICE_CHARGE_SHAPE.shape_all(charges))
 
 @api_router.post("/tax-charges/service-charges", response_model=ServiceCharge)
-async def create_service_charge(service_charge: ServiceChargeCreate, user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def create_service_charge(service_charge: ServiceChargeCreate, principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
     charge_obj = ServiceCharge(**service_charge.dict())
     await db.service_charges.insert_one(charge_obj.dict())
+    await charge_rules.record_change()
     return charge_obj
 
 @api_router.put("/tax-charges/service-charges/{charge_id}", response_model=ServiceCharge)
-async def update_service_charge(charge_id: str, charge_update: ServiceChargeCreate, user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def update_service_charge(charge_id: str, charge_update: ServiceChargeCreate, principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
     existing_charge = await db.service_charges.find_one({"id": charge_id})
@@ -1883,45 +3538,44 @@ async def update_service_charge(charge_id: str, charge_update: ServiceChargeCrea
     update_data["updated_at"] = get_current_time()
     
     await db.service_charges.update_one({"id": charge_id}, {"$set": update_data})
+    await charge_rules.record_change()
     updated_charge = await db.service_charges.find_one({"id": charge_id})
     return ServiceCharge(**updated_charge)
 
 @api_router.delete("/tax-charges/service-charges/{charge_id}")
-async def delete_service_charge(charge_id: str, user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def delete_service_charge(charge_id: str, principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
     result = await db.service_charges.delete_one({"id": charge_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Service charge not found")
+    await charge_rules.record_change()
     
     return {"message": "Service charge deleted successfully"}
 
 # Gratuity Rules
 @api_router.get("/tax-charges/gratuity-rules", response_model=List[GratuityRule])
-async def get_gratuity_rules(user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def get_gratuity_rules(principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
-    rules = await db.gratuity_rules.find().sort("created_at", -1).to_list(1000)
-    return [GratuityRule(**rule) for rule in rules]
+    rules = await db.gratuity_rules.find({}, GRATUITY_RULE_SHAPE.projection).sort("created_at", -1).to_list(1000)
+    return CustomJSONResponse(GRATUITY_RULE_SHAPE.shape_all(rules))
 
 @api_router.post("/tax-charges/gratuity-rules", response_model=GratuityRule)
-async def create_gratuity_rule(gratuity_rule: GratuityRuleCreate, user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def create_gratuity_rule(gratuity_rule: GratuityRuleCreate, principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
     rule_obj = GratuityRule(**gratuity_rule.dict())
     await db.gratuity_rules.insert_one(rule_obj.dict())
+    await charge_rules.record_change()
     return rule_obj
 
 @api_router.put("/tax-charges/gratuity-rules/{rule_id}", response_model=GratuityRule)
-async def update_gratuity_rule(rule_id: str, rule_update: GratuityRuleCreate, user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def update_gratuity_rule(rule_id: str, rule_update: GratuityRuleCreate, principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
     existing_rule = await db.gratuity_rules.find_one({"id": rule_id})
@@ -1932,45 +3586,44 @@ async def update_gratuity_rule(rule_id: str, rule_update: GratuityRuleCreate, us
     update_data["updated_at"] = get_current_time()
     
     await db.gratuity_rules.update_one({"id": rule_id}, {"$set": update_data})
+    await charge_rules.record_change()
     updated_rule = await db.gratuity_rules.find_one({"id": rule_id})
     return GratuityRule(**updated_rule)
 
 @api_router.delete("/tax-charges/gratuity-rules/{rule_id}")
-async def delete_gratuity_rule(rule_id: str, user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def delete_gratuity_rule(rule_id: str, principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
     result = await db.gratuity_rules.delete_one({"id": rule_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Gratuity rule not found")
+    await charge_rules.record_change()
     
     return {"message": "Gratuity rule deleted successfully"}
 
 # Discount Policies
 @api_router.get("/tax-charges/discount-policies", response_model=List[DiscountPolicy])
-async def get_discount_policies(user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def get_discount_policies(principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
-    policies = await db.discount_policies.find().sort("created_at", -1).to_list(1000)
-    return [DiscountPolicy(**policy) for policy in policies]
+    policies = await db.discount_policies.find({}, DISCOUNT_POLICY_SHAPE.projection).sort("created_at", -1).to_list(1000)
+    return CustomJSONResponse(DISCOUNT_POLICY_SHAPE.shape_all(policies))
 
 @api_router.post("/tax-charges/discount-policies", response_model=DiscountPolicy)
-async def create_discount_policy(discount_policy: DiscountPolicyCreate, user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def create_discount_policy(discount_policy: DiscountPolicyCreate, principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
     policy_obj = DiscountPolicy(**discount_policy.dict())
     await db.discount_policies.insert_one(policy_obj.dict())
+    await charge_rules.record_change()
     return policy_obj
 
 @api_router.put("/tax-charges/discount-policies/{policy_id}", response_model=DiscountPolicy)
-async def update_discount_policy(policy_id: str, policy_update: DiscountPolicyCreate, user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def update_discount_policy(policy_id: str, policy_update: DiscountPolicyCreate, principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
     existing_policy = await db.discount_policies.find_one({"id": policy_id})
@@ -1981,18 +3634,19 @@ async def update_discount_policy(policy_id: str, policy_update: DiscountPolicyCr
     update_data["updated_at"] = get_current_time()
     
     await db.discount_policies.update_one({"id": policy_id}, {"$set": update_data})
+    await charge_rules.record_change()
     updated_policy = await db.discount_policies.find_one({"id": policy_id})
     return DiscountPolicy(**updated_policy)
 
 @api_router.delete("/tax-charges/discount-policies/{policy_id}")
-async def delete_discount_policy(policy_id: str, user_id: str = Depends(verify_token)):
-    user = await db.users.find_one({"id": user_id})
-    if user.get("role") != "manager":
+async def delete_discount_policy(policy_id: str, principal: Principal = Depends(current_principal)):
+    if principal.role != "manager":
         raise HTTPException(status_code=403, detail="Access denied - Manager role required")
     
     result = await db.discount_policies.delete_one({"id": policy_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Discount policy not found")
+    await charge_rules.record_change()
     
     return {"message": "Discount policy deleted successfully"}
 
@@ -2005,123 +3659,12 @@ async def calculate_taxes_and_charges(order_data: Dict[str, Any], user_id: str =
     party_size = order_data.get("party_size", 1)
     applied_discounts = order_data.get("applied_discount_ids", [])
     
-    # Use the main calculation function to ensure consistency
-    total_tax, total_service_charges, total_gratuity, total_discounts = await calculate_order_taxes_and_charges(
-        subtotal, order_type, party_size, applied_discounts
-    )
-    
-    # Get detailed breakdown for display
-    # Get active tax rates that apply to this order type
-    tax_rates = await db.tax_rates.find({
-        "active": True,
-        "$or": [
-            {"applies_to_order_types": {"$exists": False}},
-            {"applies_to_order_types": {"$size": 0}},
-            {"applies_to_order_types": {"$in": [order_type]}}
-        ]
-    }).to_list(1000)
-    
-    # Calculate tax breakdown
-    tax_breakdown = []
-    for rate in tax_rates:
-        if rate["type"] == "percentage":
-            tax_amount = subtotal * (rate["rate"] / 100)
-        else:
-            tax_amount = rate["rate"]
-        
-        tax_breakdown.append({
-            "name": rate["name"],
-            "rate": rate["rate"],
-            "type": rate["type"],
-            "amount": round(tax_amount, 2)
-        })
-    
-    # Get active service charges that apply to this order type
-    service_charges = await db.service_charges.find({
-        "active": True,
-        "$or": [
-            {"applies_to_order_types": {"$exists": False}},
-            {"applies_to_order_types": {"$size": 0}},
-            {"applies_to_order_types": {"$in": [order_type]}}
-        ]
-    }).to_list(1000)
-    
-    # Calculate service charge breakdown (only include charges that actually apply)
-    service_charge_breakdown = []
-    for charge in service_charges:
-        # Determine what amount to check against based on applies_to_subtotal field
-        if charge.get("applies_to_subtotal", True):
-            check_amount = subtotal
-            base_amount = subtotal
-        else:
-            check_amount = subtotal + total_tax
-            base_amount = subtotal + total_tax
-        
-        # Check if charge meets minimum order requirements
-        minimum_amount = charge.get("minimum_order_amount", 0)
-        if minimum_amount > 0 and check_amount < minimum_amount:
-            continue
-            
-        # Check if charge meets maximum order requirements  
-        maximum_amount = charge.get("maximum_order_amount", 0)
-        if maximum_amount > 0 and check_amount > maximum_amount:
-            continue
-        
-        # This charge applies, calculate the amount
-        if charge["type"] == "percentage":
-            charge_amount = base_amount * (charge["amount"] / 100)
-        else:
-            charge_amount = charge["amount"]
-        
-        service_charge_breakdown.append({
-            "name": charge["name"],
-            "amount": charge["amount"],
-            "type": charge["type"],
-            "calculated_amount": round(charge_amount, 2),
-            "mandatory": charge["mandatory"],
-            "applies_to_subtotal": charge.get("applies_to_subtotal", True),
-            "check_amount": round(check_amount, 2),
-            "minimum_order_amount": charge.get("minimum_order_amount", 0),
-            "maximum_order_amount": charge.get("maximum_order_amount", 0)
-        })
-    
-    # Calculate suggested gratuity breakdown
-    gratuity_rules = await db.gratuity_rules.find({
-        "active": True,
-        "$or": [
-            {"applies_to_order_types": {"$exists": False}},
-            {"applies_to_order_types": {"$size": 0}},
-            {"applies_to_order_types": {"$in": [order_type]}}
-        ]
-    }).to_list(1000)
-    
-    suggested_gratuity = []
-    for rule in gratuity_rules:
-        # Check conditions similar to service charges
-        minimum_amount = rule.get("minimum_order_amount", 0)
-        if minimum_amount > 0 and subtotal < minimum_amount:
-            continue
-            
-        maximum_amount = rule.get("maximum_order_amount", 0)
-        if maximum_amount > 0 and subtotal > maximum_amount:
-            continue
-            
-        party_size_min = rule.get("party_size_minimum", 0)
-        if party_size_min > 0 and party_size < party_size_min:
-            continue
-        
-        if rule["type"] == "percentage":
-            gratuity_amount = subtotal * (rule["amount"] / 100)
-        else:
-            gratuity_amount = rule["amount"]
-        
-        suggested_gratuity.append({
-            "name": rule["name"],
-            "amount": rule["amount"],
-            "type": rule["type"],
-            "calculated_amount": round(gratuity_amount, 2),
-            "party_size_minimum": rule.get("party_size_minimum", 0)
-        })
+    # Totals and the per-rule breakdown come from the same single pricing pass
+    pricing = await calculate_order_pricing(subtotal, order_type, party_size, applied_discounts)
+    total_tax = pricing["tax"]
+    total_service_charges = pricing["service_charges"]
+    total_gratuity = pricing["gratuity"]
+    total_discounts = pricing["discounts"]
     
     return {
         "subtotal": subtotal,
@@ -2130,11 +3673,42 @@ async def calculate_taxes_and_charges(order_data: Dict[str, Any], user_id: str =
         "total_gratuity": round(total_gratuity, 2),
         "total_discounts": round(total_discounts, 2),
         "total_before_tip": round(subtotal + total_tax + total_service_charges + total_gratuity - total_discounts, 2),
-        "tax_breakdown": tax_breakdown,
-        "service_charge_breakdown": service_charge_breakdown,
-        "suggested_gratuity": suggested_gratuity
+        **pricing["breakdown"]
     }
 
+@api_router.post("/tax-charges/calculate/batch")
+async def calculate_taxes_and_charges_batch(batch: BatchPricingRequest, user_id: str = Depends(verify_token)):
+    """Price many quotes (e.g. catering party-size previews) in one vectorized pass"""
+    if len(batch.quotes) > MAX_BATCH_PRICING_QUOTES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_PRICING_QUOTES} quotes per request")
+    if not batch.quotes:
+        return {"results": []}
+    
+    rules = await charge_rules.get_rules()
+    pricing = rules.price_batch(
+        [quote.subtotal for quote in batch.quotes],
+        [quote.order_type.value for quote in batch.quotes],
+        [quote.party_size for quote in batch.quotes],
+        [quote.applied_discount_ids for quote in batch.quotes]
+    )
+    total_before_tip = (pricing["subtotal"] + pricing["tax"] + pricing["service_charges"]
+                        + pricing["gratuity"] - pricing["discounts"])
+    
+    columns = [pricing["subtotal"], pricing["tax"], pricing["service_charges"],
+               pricing["gratuity"], pricing["discounts"], total_before_tip]
+    results = [
+        {
+            "subtotal": subtotal / 100,
+            "total_tax": tax / 100,
+            "total_service_charges": service_charges / 100,
+            "total_gratuity": gratuity / 100,
+            "total_discounts": discounts / 100,
+            "total_before_tip": total / 100
+        }
+        for subtotal, tax, service_charges, gratuity, discounts, total in zip(*(column.tolist() for column in columns))
+    ]
+    return {"results": results}
+
 # Order Charge Management Endpoints
 @api_router.post("/orders/{order_id}/apply-discount")
 async def apply_discount_to_order(order_id: str, discount_data: Dict[str, Any], user_id: str = Depends(verify_token)):
@@ -2148,7 +3722,8 @@ async def apply_discount_to_order(order_id: str, discount_data: Dict[str, Any],
         raise HTTPException(status_code=400, detail="Discount ID is required")
     
     # Check if discount policy exists and is active
-    discount_policy = await db.discount_policies.find_one({"id": discount_id, "active": True})
+    rules = await charge_rules.get_rules()
+    discount_policy = rules.discount_policies.get(discount_id)
     if not discount_policy:
         raise HTTPException(status_code=404, detail="Discount policy not found or inactive")
     
@@ -2161,12 +3736,15 @@ async def apply_discount_to_order(order_id: str, discount_data: Dict[str, Any],
     applied_discount_ids.append(discount_id)
     
     # Recalculate order totals with the new discount
-    tax, service_charges_total, gratuity_total, discounts_total = await calculate_order_taxes_and_charges(
+    pricing = await calculate_order_pricing(
         order["subtotal"], 
         order["order_type"], 
         order.get("party_size", 1),
         applied_discount_ids
     )
+    tax, service_charges_total, gratuity_total, discounts_total = (
+        pricing["tax"], pricing["service_charges"], pricing["gratuity"], pricing["discounts"]
+    )
     
     new_total = order["subtotal"] + tax + service_charges_total + gratuity_total - discounts_total + order.get("tip", 0)
     
@@ -2177,11 +3755,13 @@ async def apply_discount_to_order(order_id: str, discount_data: Dict[str, Any],
         "gratuity": gratuity_total,
         "discounts": discounts_total,
         "applied_discount_ids": applied_discount_ids,
+        "pricing_breakdown": pricing["breakdown"],
         "total": new_total,
         "updated_at": get_current_time()
     }
     
     await db.orders.update_one({"id": order_id}, {"$set": update_data})
+    emit_order_event("order.updated", order)
     
     updated_order = await db.orders.find_one({"id": order_id})
     return Order(**updated_order)
@@ -2206,12 +3786,15 @@ async def remove_discount_from_order(order_id: str, discount_data: Dict[str, Any
     applied_discount_ids.remove(discount_id)
     
     # Recalculate order totals without the discount
-    tax, service_charges_total, gratuity_total, discounts_total = await calculate_order_taxes_and_charges(
+    pricing = await calculate_order_pricing(
         order["subtotal"], 
         order["order_type"], 
         order.get("party_size", 1),
         applied_discount_ids
     )
+    tax, service_charges_total, gratuity_total, discounts_total = (
+        pricing["tax"], pricing["service_charges"], pricing["gratuity"], pricing["discounts"]
+    )
     
     new_total = order["subtotal"] + tax + service_charges_total + gratuity_total - discounts_total + order.get("tip", 0)
     
@@ -2222,11 +3805,13 @@ async def remove_discount_from_order(order_id: str, discount_data: Dict[str, Any
         "gratuity": gratuity_total,
         "discounts": discounts_total,
         "applied_discount_ids": applied_discount_ids,
+        "pricing_breakdown": pricing["breakdown"],
         "total": new_total,
         "updated_at": get_current_time()
     }
     
     await db.orders.update_one({"id": order_id}, {"$set": update_data})
+    emit_order_event("order.updated", order)
     
     updated_order = await db.orders.find_one({"id": order_id})
     return Order(**updated_order)
@@ -2239,7 +3824,8 @@ async def get_available_discounts_for_order(order_id: str, user_id: str = Depend
         raise HTTPException(status_code=404, detail="Order not found")
     
     # Get all active discount policies
-    discount_policies = await db.discount_policies.find({"active": True}).to_list(1000)
+    rules = await charge_rules.get_rules()
+    discount_policies = list(rules.discount_policies.values())
     
     available_discounts = []
     applied_discount_ids = order.get("applied_discount_ids", [])
@@ -2277,10 +3863,9 @@ async def get_available_service_charges_for_order(order_id: str, user_id: str =
         raise HTTPException(status_code=404, detail="Order not found")
     
     # Get service charges that are not mandatory (can be manually applied/removed)
-    service_charges = await db.service_charges.find({
-        "active": True,
-        "mandatory": False  # Only non-mandatory charges can be manually managed
-    }).to_list(1000)
+    rules = await charge_rules.get_rules()
+    # Only non-mandatory charges can be manually managed
+    service_charges = [charge for charge in rules.service_charges if not charge.get("mandatory", False)]
     
     available_charges = []
     
@@ -2313,6 +3898,8 @@ async def get_available_service_charges_for_order(order_id: str, user_id: str =
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -2328,6 +3915,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def run_startup_migrations():
+    await migrate_pin_fingerprints()
+    await backfill_order_customer_ids()
+    await backfill_customer_phone_keys()
+    await backfill_customer_search_tokens()
+    await ensure_indexes()
+    await order_numbers.seed()
+    if LIVE_EVENTS_SOURCE == "change_stream":
+        app.state.change_stream_task = asyncio.create_task(watch_change_streams())
+    if CUSTOMER_STATS_RECONCILE_HOURS > 0:
+        app.state.reconcile_task = asyncio.create_task(run_customer_stats_reconciliation())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    for task_name in ("change_stream_task", "reconcile_task"):
+        task = getattr(app.state, task_name, None)
+        if task:
+            task.cancel()
+    client.close()
+    pin_hasher.shutdown()
\ No newline at end of file
@@ -4,6 +4,8 @@ import os
 import sys
 from motor.motor_asyncio import AsyncIOMotorClient
 import bcrypt
+import hmac
+import hashlib
 from datetime import datetime
 import uuid
 
@@ -23,6 +25,11 @@ async def create_demo_users():
     def hash_pin(pin):
         return bcrypt.hashpw(pin.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
     
+    # PIN lookup fingerprint, must match pin_fingerprint() in backend/server.py
+    pin_lookup_secret = os.environ.get('PIN_LOOKUP_SECRET', os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production'))
+    def pin_fingerprint(pin):
+        return hmac.new(pin_lookup_secret.encode('utf-8'), pin.encode('utf-8'), hashlib.sha256).hexdigest()
+    
     # Create demo users
     demo_users = [
         {
@@ -33,7 +40,8 @@ async def create_demo_users():
             "phone": "555-0001",
             "is_active": True,
             "created_at": datetime.utcnow(),
-            "hashed_pin": hash_pin("1234")
+            "hashed_pin": hash_pin("1234"),
+            "pin_fingerprint": pin_fingerprint("1234")
         },
         {
             "id": str(uuid.uuid4()),
@@ -43,7 +51,8 @@ async def create_demo_users():
             "phone": "555-0002",
             "is_active": True,
             "created_at": datetime.utcnow(),
-            "hashed_pin": hash_pin("5678")
+            "hashed_pin": hash_pin("5678"),
+            "pin_fingerprint": pin_fingerprint("5678")
         }
     ]
     
@@ -1,6 +1,8 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import { formatLocalTime, getTimeElapsed, getOrderAgeColor } from '../utils/dateUtils';
+import { subscribeLiveEvents } from '../utils/liveEvents';
+import { applyOrdersDelta } from '../utils/orderSync';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -131,11 +133,25 @@ const ActiveOrders = ({ onOrderClick, refreshTrigger }) => {
   const [selectedOrders, setSelectedOrders] = useState(new Set());
   const [showCancelModal, setShowCancelModal] = useState(false);
   const [selectionMode, setSelectionMode] = useState(false);
+  const syncCursor = useRef('');
 
   useEffect(() => {
     fetchActiveOrders();
-    const interval = setInterval(fetchActiveOrders, 30000); // Refresh every 30 seconds
-    return () => clearInterval(interval);
+    // Refresh on live order events; poll every 30 seconds only while the event stream is down
+    let interval = setInterval(fetchActiveOrders, 30000);
+    const unsubscribe = subscribeLiveEvents(['orders'], () => fetchActiveOrders(), (connected) => {
+      if (connected) {
+        clearInterval(interval);
+        interval = null;
+        fetchActiveOrders(); // Catch up on anything missed while disconnected
+      } else if (!interval) {
+        interval = setInterval(fetchActiveOrders, 30000);
+      }
+    });
+    return () => {
+      unsubscribe();
+      clearInterval(interval);
+    };
   }, [refreshTrigger]);
 
   // Update current time every 30 seconds to refresh timers in real-time
@@ -149,8 +165,10 @@ const ActiveOrders = ({ onOrderClick, refreshTrigger }) => {
 
   const fetchActiveOrders = async () => {
     try {
-      const response = await axios.get(`${API}/orders/active`);
-      setOrders(response.data);
+      // Only orders changed since the last poll are returned
+      const response = await axios.get(`${API}/orders/active`, { params: { since: syncCursor.current } });
+      syncCursor.current = response.data.cursor;
+      setOrders(current => applyOrdersDelta(current, response.data));
     } catch (error) {
       console.error('Error fetching orders:', error);
     } finally {
@@ -310,15 +310,27 @@ const CustomerManagement = ({ onBack }) => {
   }, []);
 
   useEffect(() => {
-    if (searchTerm) {
-      const filtered = customers.filter(customer => 
-        customer.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        customer.phone.includes(searchTerm)
-      );
-      setFilteredCustomers(filtered);
-    } else {
+    if (!searchTerm.trim()) {
       setFilteredCustomers(customers);
+      return;
     }
+    
+    // Server-side typeahead, debounced; responses for an outdated search term are dropped
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/customers/search`, { params: { q: searchTerm, limit: 50 } });
+        if (!cancelled) {
+          setFilteredCustomers(response.data);
+        }
+      } catch (error) {
+        console.error('Error searching customers:', error);
+      }
+    }, 200);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
   }, [customers, searchTerm]);
 
   const fetchCustomers = async () => {
@@ -339,11 +351,11 @@ const CustomerManagement = ({ onBack }) => {
       // Fetch customer statistics and recent orders
       const [statsResponse, ordersResponse] = await Promise.all([
         axios.get(`${API}/customers/${customer.id}/stats`),
-        axios.get(`${API}/customers/${customer.id}/orders`)
+        axios.get(`${API}/customers/${customer.id}/orders`, { params: { limit: 5 } })
       ]);
       
       setCustomerStats(statsResponse.data);
-      setCustomerOrders(ordersResponse.data);
+      setCustomerOrders(ordersResponse.data.orders);
       setShowCustomerModal(true);
     } catch (error) {
       console.error('Error fetching customer details:', error);
@@ -4,6 +4,7 @@ import { usePrinter } from '../PrinterContext';
 import { PaymentModal, ItemRemovalModal } from './ModalComponents';
 import TableMergeModal from './TableMergeModal';
 import { parseBackendTimestamp, formatLocalDate, formatLocalTime, formatLocalDateTime, getTimeElapsed, getOrderAgeColor } from '../utils/dateUtils';
+import { subscribeLiveEvents } from '../utils/liveEvents';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -145,8 +146,9 @@ const NewOrder = ({ selectedTable, editingOrder, editingActiveOrder, onBack, fro
   // Lookup customer by phone number
   const lookupCustomerByPhone = async (phone) => {
     try {
-      const response = await axios.get(`${API}/customers/${phone}`);
-      const customer = response.data;
+      // Caller ID: profile, stats and recent orders for the number in one request
+      const response = await axios.get(`${API}/customers/caller/${encodeURIComponent(phone)}`);
+      const { customer } = response.data;
       
       // Auto-fill name and address if found
       setCustomerInfo(prev => ({
@@ -164,10 +166,10 @@ const NewOrder = ({ selectedTable, editingOrder, editingActiveOrder, onBack, fro
     }
   };
 
-  // Lookup customer by address (search through all customers)
+  // Lookup customer by address (street address words are indexed for search)
   const lookupCustomerByAddress = async (address) => {
     try {
-      const response = await axios.get(`${API}/customers`);
+      const response = await axios.get(`${API}/customers/search`, { params: { q: address, limit: 5 } });
       const customers = response.data;
       
       // Find customer with matching address (case insensitive partial match)
@@ -200,41 +202,18 @@ const NewOrder = ({ selectedTable, editingOrder, editingActiveOrder, onBack, fro
     } else if (editingActiveOrder) {
       loadActiveOrder();
     }
-    fetchMenuItems();
-    fetchCategories();
-    fetchModifierData();
+    fetchMenuSnapshot();
     fetchTables();
     fetchTaxChargesData(); // Load tax and charges data for dynamic calculation
   }, [editingOrder, editingActiveOrder]);
 
-  // Listen for tax and charges data changes from other components
+  // Refetch tax and charges data whenever a manager edits it on any terminal
   useEffect(() => {
-    const handleStorageChange = (e) => {
-      if (e.key === 'taxChargesDataChanged') {
-        console.log('Tax and charges data changed, refreshing...');
+    return subscribeLiveEvents(['config'], (event) => {
+      if (event.type === 'tax_charges.changed' || event.type === 'resync') {
         fetchTaxChargesData();
       }
-    };
-
-    window.addEventListener('storage', handleStorageChange);
-    return () => window.removeEventListener('storage', handleStorageChange);
-  }, []);
-
-  // Also listen for changes within the same window
-  useEffect(() => {
-    const checkForChanges = () => {
-      const lastChange = localStorage.getItem('taxChargesDataChanged');
-      const currentCheck = localStorage.getItem('lastTaxChargesCheck') || '0';
-      
-      if (lastChange && lastChange !== currentCheck) {
-        console.log('Tax and charges data changed within same window, refreshing...');
-        fetchTaxChargesData();
-        localStorage.setItem('lastTaxChargesCheck', lastChange);
-      }
-    };
-
-    const interval = setInterval(checkForChanges, 1000); // Check every second
-    return () => clearInterval(interval);
+    });
   }, []);
 
   const fetchTables = async () => {
@@ -356,33 +335,43 @@ const NewOrder = ({ selectedTable, editingOrder, editingActiveOrder, onBack, fro
     }
   };
 
-  const fetchMenuItems = async () => {
-    try {
-      const response = await axios.get(`${API}/menu/items`);
-      setMenuItems(response.data);
-    } catch (error) {
-      console.error('Error fetching menu items:', error);
-    }
-  };
-
-  const fetchCategories = async () => {
+  // Menu, categories and modifiers in one request; the browser revalidates it by ETag,
+  // so the menu is only re-downloaded after a manager actually edits it
+  const fetchMenuSnapshot = async () => {
     try {
-      const response = await axios.get(`${API}/menu/categories`);
+      const response = await axios.get(`${API}/menu/snapshot`);
+      setMenuItems(response.data.items);
       setCategories(response.data.categories);
+      setModifierGroups(response.data.modifier_groups);
+      setModifiers(response.data.modifiers);
     } catch (error) {
-      console.error('Error fetching categories:', error);
+      console.error('Error fetching menu snapshot:', error);
     }
   };
 
-  const fetchExistingCustomers = async () => {
-    try {
-      const response = await axios.get(`${API}/customers`);
-      setExistingCustomers(response.data);
-    } catch (error) {
-      console.error('Error fetching customers:', error);
-      setExistingCustomers([]);
-    }
-  };
+  // Customer picker typeahead: recent customers for an empty query, otherwise server-side matches
+  useEffect(() => {
+    if (!showCustomerSelectionModal) return;
+    
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/customers/search`, { params: { q: customerSearchQuery } });
+        if (!cancelled) {
+          setExistingCustomers(response.data);
+        }
+      } catch (error) {
+        console.error('Error searching customers:', error);
+        if (!cancelled) {
+          setExistingCustomers([]);
+        }
+      }
+    }, customerSearchQuery ? 200 : 0);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [showCustomerSelectionModal, customerSearchQuery]);
 
   const handleSelectExistingCustomer = (customer) => {
     setCustomerInfo({
@@ -399,33 +388,16 @@ const NewOrder = ({ selectedTable, editingOrder, editingActiveOrder, onBack, fro
     setCustomerSearchQuery('');
   };
 
-  const fetchModifierData = async () => {
-    try {
-      const [groupsRes, modRes] = await Promise.all([
-        axios.get(`${API}/modifiers/groups`),
-        axios.get(`${API}/modifiers`)
-      ]);
-      setModifierGroups(groupsRes.data);
-      setModifiers(modRes.data);
-    } catch (error) {
-      console.error('Error fetching modifier data:', error);
-    }
-  };
-
   const fetchTaxChargesData = async () => {
     try {
-      // Fetch all tax and charges data from backend APIs
-      const [taxRatesRes, serviceChargesRes, gratuityRulesRes, discountPoliciesRes] = await Promise.all([
-        axios.get(`${API}/tax-charges/tax-rates`),
-        axios.get(`${API}/tax-charges/service-charges`),
-        axios.get(`${API}/tax-charges/gratuity-rules`),
-        axios.get(`${API}/tax-charges/discount-policies`)
-      ]);
+      // One combined payload; the browser revalidates it with the snapshot's ETag
+      const response = await axios.get(`${API}/tax-charges/snapshot`);
+      const { tax_rates, service_charges, gratuity_rules, discount_policies } = response.data;
       
-      setTaxRates(taxRatesRes.data.length > 0 ? taxRatesRes.data : getDefaultTaxRates());
-      setServiceCharges(serviceChargesRes.data.length > 0 ? serviceChargesRes.data : getDefaultServiceCharges());
-      setGratuityRules(gratuityRulesRes.data.length > 0 ? gratuityRulesRes.data : getDefaultGratuityRules());
-      setDiscountPolicies(discountPoliciesRes.data.length > 0 ? discountPoliciesRes.data : getDefaultDiscountPolicies());
+      setTaxRates(tax_rates.length > 0 ? tax_rates : getDefaultTaxRates());
+      setServiceCharges(service_charges.length > 0 ? service_charges : getDefaultServiceCharges());
+      setGratuityRules(gratuity_rules.length > 0 ? gratuity_rules : getDefaultGratuityRules());
+      setDiscountPolicies(discount_policies.length > 0 ? discount_policies : getDefaultDiscountPolicies());
       
     } catch (error) {
       console.error('Error fetching tax/charges data:', error);
@@ -909,32 +881,6 @@ const NewOrder = ({ selectedTable, editingOrder, editingActiveOrder, onBack, fro
       return;
     }
 
-    // Auto-create customer if they don't exist and we have customer info
-    if (customerInfo.phone && customerInfo.name && !currentOrder) {
-      try {
-        const response = await axios.get(`${API}/customers/${customerInfo.phone}`);
-        // Customer exists, we're good
-      } catch (error) {
-        if (error.response?.status === 404) {
-          // Customer doesn't exist, create them
-          try {
-            const newCustomerData = {
-              name: customerInfo.name,
-              phone: customerInfo.phone,
-              address: customerInfo.address || '',
-              email: '',
-              notes: `Auto-created from order on ${new Date().toLocaleDateString()}`
-            };
-            await axios.post(`${API}/customers`, newCustomerData);
-            console.log('New customer auto-created successfully');
-          } catch (createError) {
-            console.error('Error auto-creating customer:', createError);
-            // Continue with order creation even if customer creation fails
-          }
-        }
-      }
-    }
-
     try {
       const orderData = {
         customer_name: customerInfo.name,
@@ -1321,10 +1267,7 @@ const NewOrder = ({ selectedTable, editingOrder, editingActiveOrder, onBack, fro
                   <h3 className="font-semibold text-lg mb-4 text-gray-700">Customer Information</h3>
                   <div className="flex flex-col sm:flex-row gap-3 justify-center">
                     <button
-                      onClick={() => {
-                        fetchExistingCustomers();
-                        setShowCustomerSelectionModal(true);
-                      }}
+                      onClick={() => setShowCustomerSelectionModal(true)}
                       className="bg-blue-600 text-white px-6 py-3 rounded-lg hover:bg-blue-700 text-lg font-medium flex items-center justify-center"
                     >
                       <svg className="w-5 h-5 mr-2" fill="none" stroke="currentColor" viewBox="0 0 24 24">
@@ -1802,12 +1745,7 @@ const NewOrder = ({ selectedTable, editingOrder, editingActiveOrder, onBack, fro
 
               {/* Customer List */}
               <div className="max-h-96 overflow-y-auto">
-                {existingCustomers
-                  .filter(customer => 
-                    customer.name.toLowerCase().includes(customerSearchQuery.toLowerCase()) ||
-                    customer.phone.includes(customerSearchQuery)
-                  )
-                  .length === 0 ? (
+                {existingCustomers.length === 0 ? (
                   <div className="text-center py-8">
                     <span className="text-gray-500">
                       {customerSearchQuery ? 'No customers found matching your search.' : 'No customers found.'}
@@ -1815,12 +1753,7 @@ const NewOrder = ({ selectedTable, editingOrder, editingActiveOrder, onBack, fro
                   </div>
                 ) : (
                   <div className="grid grid-cols-1 gap-3">
-                    {existingCustomers
-                      .filter(customer => 
-                        customer.name.toLowerCase().includes(customerSearchQuery.toLowerCase()) ||
-                        customer.phone.includes(customerSearchQuery)
-                      )
-                      .map(customer => (
+                    {existingCustomers.map(customer => (
                         <div
                           key={customer.id}
                           onClick={() => handleSelectExistingCustomer(customer)}
@@ -1,14 +1,41 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
-import { formatLocalDate, formatLocalTime, getTimeElapsed, parseBackendTimestamp } from '../utils/dateUtils';
+import { formatLocalDate, formatLocalTime, getTimeElapsed } from '../utils/dateUtils';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const PAGE_SIZE = 50;
 
-// Order History Component - extracted from App.js without changes
+const formatDateParam = (date) => {
+  const month = String(date.getMonth() + 1).padStart(2, '0');
+  const day = String(date.getDate()).padStart(2, '0');
+  return `${date.getFullYear()}-${month}-${day}`;
+};
+
+// Map the date dropdown onto /orders/history's date_filter/start_date/end_date parameters
+const getDateParams = (dateFilter) => {
+  const today = new Date();
+  if (dateFilter === 'today') {
+    return { date_filter: 'today' };
+  }
+  if (dateFilter === 'yesterday') {
+    const yesterday = formatDateParam(new Date(today.getFullYear(), today.getMonth(), today.getDate() - 1));
+    return { date_filter: 'custom', start_date: yesterday, end_date: yesterday };
+  }
+  if (dateFilter === 'week') {
+    const weekAgo = new Date(today.getFullYear(), today.getMonth(), today.getDate() - 7);
+    return { date_filter: 'custom', start_date: formatDateParam(weekAgo) };
+  }
+  return {};
+};
+
+// Order History Component - pages through /orders/history
 const OrderHistory = ({ onBack }) => {
   const [orders, setOrders] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalCount, setTotalCount] = useState(0);
   const [filter, setFilter] = useState('all');
   const [dateFilter, setDateFilter] = useState('all');
   const [searchTerm, setSearchTerm] = useState('');
@@ -16,13 +43,24 @@ const OrderHistory = ({ onBack }) => {
   const [showOrderModal, setShowOrderModal] = useState(false);
 
   useEffect(() => {
-    fetchAllOrders();
-  }, []);
+    setLoading(true);
+    fetchOrderHistory();
+  }, [filter, dateFilter]);
 
-  const fetchAllOrders = async () => {
+  // Status and date filters run on the server; pages are fetched newest first by cursor
+  const fetchOrderHistory = async (cursor = null) => {
     try {
-      const response = await axios.get(`${API}/orders`);
-      setOrders(response.data);
+      const params = { limit: PAGE_SIZE, ...getDateParams(dateFilter) };
+      if (filter !== 'all') params.status = filter;
+      if (cursor) params.cursor = cursor;
+      const response = await axios.get(`${API}/orders/history`, { params });
+      if (cursor) {
+        setOrders(prev => [...prev, ...response.data.orders]);
+      } else {
+        setOrders(response.data.orders);
+        setTotalCount(response.data.total_count);
+      }
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       console.error('Error fetching order history:', error);
     } finally {
@@ -30,57 +68,33 @@ const OrderHistory = ({ onBack }) => {
     }
   };
 
+  const loadMoreOrders = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    await fetchOrderHistory(nextCursor);
+    setLoadingMore(false);
+  };
+
   const handleOrderClick = (order) => {
     setSelectedOrder(order);
     setShowOrderModal(true);
   };
 
+  // Search only narrows the pages loaded so far
   const getFilteredOrders = () => {
-    let filtered = orders;
-
-    // Filter by status
-    if (filter !== 'all') {
-      filtered = filtered.filter(order => order.status === filter);
+    if (!searchTerm) {
+      return orders;
     }
-
-    // Filter by date
-    const now = new Date();
-    const today = new Date(now.getFullYear(), now.getMonth(), now.getDate());
-    const yesterday = new Date(today.getTime() - 24 * 60 * 60 * 1000);
-    const weekAgo = new Date(today.getTime() - 7 * 24 * 60 * 60 * 1000);
-
-    if (dateFilter === 'today') {
-      filtered = filtered.filter(order => {
-        const orderDate = parseBackendTimestamp(order.created_at);
-        return orderDate >= today;
-      });
-    } else if (dateFilter === 'yesterday') {
-      filtered = filtered.filter(order => {
-        const orderDate = parseBackendTimestamp(order.created_at);
-        return orderDate >= yesterday && orderDate < today;
-      });
-    } else if (dateFilter === 'week') {
-      filtered = filtered.filter(order => {
-        const orderDate = parseBackendTimestamp(order.created_at);
-        return orderDate >= weekAgo;
-      });
-    }
-
-    // Filter by search term
-    if (searchTerm) {
-      filtered = filtered.filter(order => 
-        order.order_number.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        order.customer_name?.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        order.customer_phone?.includes(searchTerm)
-      );
-    }
-
-    return filtered.sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
+    return orders.filter(order => 
+      order.order_number.toLowerCase().includes(searchTerm.toLowerCase()) ||
+      order.customer_name?.toLowerCase().includes(searchTerm.toLowerCase()) ||
+      order.customer_phone?.includes(searchTerm)
+    );
   };
 
   const getStatusColor = (status) => {
     switch (status) {
-      case 'completed': return 'bg-green-100 text-green-800';
+      case 'paid': return 'bg-green-100 text-green-800';
       case 'cancelled': return 'bg-red-100 text-red-800';
       case 'preparing': return 'bg-yellow-100 text-yellow-800';
       case 'ready': return 'bg-blue-100 text-blue-800';
@@ -130,7 +144,9 @@ const OrderHistory = ({ onBack }) => {
                 <option value="pending">Pending</option>
                 <option value="preparing">Preparing</option>
                 <option value="ready">Ready</option>
-                <option value="completed">Completed</option>
+                <option value="out_for_delivery">Out for Delivery</option>
+                <option value="delivered">Delivered</option>
+                <option value="paid">Paid</option>
                 <option value="cancelled">Cancelled</option>
               </select>
               <select
@@ -151,7 +167,7 @@ const OrderHistory = ({ onBack }) => {
         <div className="bg-white rounded-lg shadow">
           <div className="px-6 py-4 border-b border-gray-200">
             <h2 className="text-lg font-semibold text-gray-800">
-              Orders ({filteredOrders.length})
+              Orders ({searchTerm ? filteredOrders.length : totalCount})
             </h2>
           </div>
           
@@ -218,6 +234,17 @@ const OrderHistory = ({ onBack }) => {
                   ))}
                 </tbody>
               </table>
+              {nextCursor && (
+                <div className="p-4 text-center border-t border-gray-200">
+                  <button
+                    onClick={loadMoreOrders}
+                    disabled={loadingMore}
+                    className="text-blue-600 hover:text-blue-900 font-medium disabled:text-gray-400"
+                  >
+                    {loadingMore ? 'Loading...' : 'Load more orders'}
+                  </button>
+                </div>
+              )}
             </div>
           )}
         </div>
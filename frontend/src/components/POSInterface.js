@@ -338,13 +338,8 @@ const POSInterface = () => {
   }
 
   if (currentView === 'tax-settings') {
-    return <TaxChargesComponent
-      onBack={() => setCurrentView('settings')}
-      onDataChange={() => {
-        // Trigger a refresh for any active NewOrder components
-        localStorage.setItem('taxChargesDataChanged', Date.now().toString());
-      }}
-    />;
+    // Open order screens pick up edits through the server's config events
+    return <TaxChargesComponent onBack={() => setCurrentView('settings')} />;
   }
 
   return (
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { subscribeLiveEvents } from '../utils/liveEvents';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -31,6 +32,8 @@ const TableManagement = ({ onTableSelect }) => {
 
   useEffect(() => {
     fetchTables();
+    // Keep table statuses current as other terminals seat, move, merge and pay
+    return subscribeLiveEvents(['tables'], () => fetchTables());
   }, []);
 
   const fetchTables = async () => {
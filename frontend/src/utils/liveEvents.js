@@ -0,0 +1,22 @@
+// Server-Sent Events subscription for live order/table/config changes (GET /api/events)
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+
+// Subscribe to one or more topics ('orders', 'tables', 'config'). Events only carry ids and statuses,
+// so callers refetch what they display. onConnectionChange(true/false) lets callers fall back
+// to polling while the stream is down; EventSource reconnects on its own.
+// Returns an unsubscribe function.
+export const subscribeLiveEvents = (topics, onEvent, onConnectionChange) => {
+  // EventSource cannot send an Authorization header, so the token goes in the query string
+  const token = localStorage.getItem('token');
+  const params = new URLSearchParams({ topics: topics.join(','), token: token || '' });
+  const source = new EventSource(`${BACKEND_URL}/api/events?${params}`);
+
+  source.onopen = () => onConnectionChange && onConnectionChange(true);
+  source.onerror = () => onConnectionChange && onConnectionChange(false);
+  topics.forEach(topic => {
+    source.addEventListener(topic, (message) => onEvent(JSON.parse(message.data)));
+  });
+
+  return () => source.close();
+};
@@ -0,0 +1,10 @@
+// Client side of the /orders/active?since= delta sync
+
+// Apply a delta to the orders on screen: a reset replaces them, removed_ids (closed or deleted
+// orders) are dropped, changed orders are upserted. Returns a new array, newest first.
+export const applyOrdersDelta = (currentOrders, delta) => {
+  const byId = new Map(delta.reset ? [] : currentOrders.map(order => [order.id, order]));
+  delta.removed_ids.forEach(id => byId.delete(id));
+  delta.orders.forEach(order => byId.set(order.id, order));
+  return Array.from(byId.values()).sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
+};
@@ -0,0 +1,22 @@
+import { applyOrdersDelta } from './orderSync';
+
+const order = (id, createdAt, status = 'pending') => ({ id, created_at: createdAt, status });
+
+test('applies upserts, removals and resets from an active-orders delta', () => {
+  const current = [order('b', '2024-01-01T10:05:00Z'), order('a', '2024-01-01T10:00:00Z')];
+
+  const updated = applyOrdersDelta(current, {
+    orders: [order('a', '2024-01-01T10:00:00Z', 'ready'), order('c', '2024-01-01T10:10:00Z')],
+    removed_ids: ['b'],
+    reset: false
+  });
+  expect(updated).toEqual([order('c', '2024-01-01T10:10:00Z'), order('a', '2024-01-01T10:00:00Z', 'ready')]);
+  expect(current).toHaveLength(2);
+
+  const reset = applyOrdersDelta(updated, {
+    orders: [order('d', '2024-01-01T11:00:00Z')],
+    removed_ids: [],
+    reset: true
+  });
+  expect(reset).toEqual([order('d', '2024-01-01T11:00:00Z')]);
+});
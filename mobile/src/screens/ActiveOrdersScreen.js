@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   View,
   Text,
@@ -13,6 +13,7 @@ import {
 import Icon from 'react-native-vector-icons/MaterialIcons';
 import { useAuth } from '../contexts/AuthContext';
 import axios from 'axios';
+import { applyOrdersDelta } from '../utils/orderSync';
 
 const ActiveOrdersScreen = ({ navigation }) => {
   const { API } = useAuth();
@@ -21,6 +22,7 @@ const ActiveOrdersScreen = ({ navigation }) => {
   const [filter, setFilter] = useState('all');
   const [selectedOrders, setSelectedOrders] = useState([]);
   const [selectMode, setSelectMode] = useState(false);
+  const syncCursor = useRef('');
 
   useEffect(() => {
     fetchActiveOrders();
@@ -30,8 +32,10 @@ const ActiveOrdersScreen = ({ navigation }) => {
 
   const fetchActiveOrders = async () => {
     try {
-      const response = await axios.get(`${API}/orders/active`);
-      setOrders(response.data);
+      // Only orders changed since the last poll are returned
+      const response = await axios.get(`${API}/orders/active`, { params: { since: syncCursor.current } });
+      syncCursor.current = response.data.cursor;
+      setOrders(current => applyOrdersDelta(current, response.data));
     } catch (error) {
       console.error('Error fetching active orders:', error);
       Alert.alert('Error', 'Failed to load active orders');
@@ -20,6 +20,8 @@ const OrderHistoryScreen = ({ navigation }) => {
   const { API } = useAuth();
   const { printOrderReceipt } = usePrinter();
   const [orders, setOrders] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalCount, setTotalCount] = useState(0);
   const [refreshing, setRefreshing] = useState(false);
   const [dateFilter, setDateFilter] = useState('all');
   const [selectedOrder, setSelectedOrder] = useState(null);
@@ -29,17 +31,37 @@ const OrderHistoryScreen = ({ navigation }) => {
     fetchOrderHistory();
   }, [dateFilter]);
 
-  const fetchOrderHistory = async () => {
+  const fetchOrderHistory = async (cursor = null) => {
     try {
-      const params = dateFilter !== 'all' ? { date_filter: dateFilter } : {};
+      const params = { limit: 50 };
+      if (dateFilter !== 'all') params.date_filter = dateFilter;
+      if (cursor) params.cursor = cursor;
       const response = await axios.get(`${API}/orders/history`, { params });
-      setOrders(response.data);
+      if (cursor) {
+        setOrders(prev => [...prev, ...response.data.orders]);
+      } else {
+        setOrders(response.data.orders);
+        setTotalCount(response.data.total_count);
+      }
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       console.error('Error fetching order history:', error);
       Alert.alert('Error', 'Failed to load order history');
     }
   };
 
+  const loadMoreOrders = () => {
+    if (nextCursor) {
+      fetchOrderHistory(nextCursor);
+    }
+  };
+
+  // History rows are summaries; fetch the full order for details and printing
+  const fetchFullOrder = async (order) => {
+    const response = await axios.get(`${API}/orders/${order.id}`);
+    return response.data;
+  };
+
   const onRefresh = async () => {
     setRefreshing(true);
     await fetchOrderHistory();
@@ -65,7 +87,8 @@ const OrderHistoryScreen = ({ navigation }) => {
 
   const handlePrintOrder = async (order) => {
     try {
-      const result = await printOrderReceipt(order);
+      const fullOrder = order.subtotal !== undefined ? order : await fetchFullOrder(order);
+      const result = await printOrderReceipt(fullOrder);
       if (result.success) {
         Alert.alert('Success', 'Receipt printed successfully');
       } else {
@@ -76,9 +99,14 @@ const OrderHistoryScreen = ({ navigation }) => {
     }
   };
 
-  const showOrderDetails = (order) => {
-    setSelectedOrder(order);
-    setShowOrderModal(true);
+  const showOrderDetails = async (order) => {
+    try {
+      setSelectedOrder(await fetchFullOrder(order));
+      setShowOrderModal(true);
+    } catch (error) {
+      console.error('Error fetching order details:', error);
+      Alert.alert('Error', 'Failed to load order details');
+    }
   };
 
   const renderOrderCard = ({ item: order }) => {
@@ -325,6 +353,13 @@ const OrderHistoryScreen = ({ navigation }) => {
         refreshControl={
           <RefreshControl refreshing={refreshing} onRefresh={onRefresh} />
         }
+        onEndReached={loadMoreOrders}
+        onEndReachedThreshold={0.5}
+        ListHeaderComponent={
+          totalCount > 0 ? (
+            <Text style={styles.orderCountText}>{totalCount} orders</Text>
+          ) : null
+        }
         ListEmptyComponent={
           <View style={styles.emptyState}>
             <Icon name="history" size={64} color="#d1d5db" />
@@ -362,6 +397,11 @@ const styles = StyleSheet.create({
     borderBottomWidth: 1,
     borderBottomColor: '#e5e7eb',
   },
+  orderCountText: {
+    fontSize: 14,
+    color: '#6b7280',
+    marginBottom: 8,
+  },
   filterButton: {
     paddingHorizontal: 16,
     paddingVertical: 8,
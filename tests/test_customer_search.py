@@ -0,0 +1,51 @@
+import asyncio
+import json
+import os
+import sys
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "pos_test")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from server import (  # noqa: E402
+    customer_search_query, normalize_phone, phone_search_prefix, search_customers, search_tokens
+)
+
+
+def test_partial_numbers_share_a_prefix_with_the_stored_phone():
+    stored = normalize_phone("(555) 111-2222")
+    for typed in ["555", "5551", "1555", "1 555 11", "+1 555", "(555) 11"]:
+        prefix = phone_search_prefix(typed)
+        assert stored.startswith(prefix), (typed, prefix)
+
+
+def test_explicit_international_prefixes_are_kept():
+    assert phone_search_prefix("+44 20") == "+4420"
+    assert phone_search_prefix("0044 20") == "+4420"
+
+
+def test_numeric_query_matches_phone_or_address_tokens():
+    query = customer_search_query("1555")
+    phone_clause, token_clause = query["$or"]
+    assert phone_clause["phone_normalized"]["$regex"] == r"^\+1555"
+    assert token_clause == {"$and": [{"search_tokens": {"$regex": "^1555"}}]}
+
+
+def test_text_query_requires_every_word():
+    assert customer_search_query("Ann  Main") == {"$and": [
+        {"search_tokens": {"$regex": "^ann"}},
+        {"search_tokens": {"$regex": "^main"}}
+    ]}
+    assert customer_search_query(" - ") is None
+
+
+def test_accented_names_fold_to_whole_words():
+    assert search_tokens("José Núñez", "Calle Año 3") == ["jose", "nunez", "calle", "ano", "3"]
+    assert customer_search_query("Núñez") == {"$and": [{"search_tokens": {"$regex": "^nunez"}}]}
+    assert customer_search_query("nunez") == customer_search_query("NÚÑEZ")
+    assert search_tokens("李 小龍") == ["李", "小龍"]
+
+
+def test_query_without_searchable_words_returns_no_customers():
+    response = asyncio.run(search_customers(q=" - ", limit=None, user_id="user"))
+    assert json.loads(response.body) == []